@@ -0,0 +1,115 @@
+"""
+Measures the throughput and latency of an InferencePool under concurrent
+single-text calls, without micro-batching, with it, and with it but without
+grouping the texts by length.
+
+By default the worker runs a synthetic model whose cost, like a CPU forward
+pass, is a fixed overhead per call plus a cost per padded token (the batch
+size times the length of its longest text). It burns CPU rather than
+sleeping, so the worker competes with the server for the cores as a real
+model does. Pass a Hugging Face text-classification model id to measure a
+real model instead (requires transformers).
+
+Usage: python -m benchmarks.microbatch_benchmark [clients] [requests] [model]
+"""
+
+import asyncio
+import random
+import sys
+import time
+
+from utils.pipelines.batching import BATCH_SIZE, MicroBatcher
+from utils.pipelines.inference import InferencePool
+
+
+# Cost model of the synthetic model, in seconds
+CALL_OVERHEAD = 0.01
+TOKEN_COST = 0.00002
+
+WORDS = ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing"]
+
+
+def load_model(model: str):
+    # Runs in the inference worker process
+    if model != "synthetic":
+        from transformers import pipeline
+
+        classifier = pipeline("text-classification", model=model)
+        return lambda texts: classifier(texts, batch_size=len(texts), truncation=True)
+
+    def classify(texts):
+        tokens = len(texts) * max(len(text.split()) for text in texts)
+        deadline = time.perf_counter() + CALL_OVERHEAD + TOKEN_COST * tokens
+        while time.perf_counter() < deadline:
+            pass
+        return [{"label": "SAFE", "score": 1.0} for _ in texts]
+
+    return classify
+
+
+def make_texts(count, seed=0):
+    # Mostly short prompts with a tail of long documents
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(count):
+        length = rng.choice([8, 16, 24, 32, 64]) if rng.random() < 0.8 else 256
+        texts.append(" ".join(rng.choice(WORDS) for _ in range(length)))
+    return texts
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def run(name, infer, clients, requests):
+    texts = make_texts(clients * requests)
+    latencies = []
+
+    async def client(offset):
+        for index in range(requests):
+            start_time = time.perf_counter()
+            await infer([texts[offset + index]])
+            latencies.append(time.perf_counter() - start_time)
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*[client(i * requests) for i in range(clients)])
+    total_time = time.perf_counter() - start_time
+
+    sizes = BATCH_SIZE.values().get((name,))
+    batches = f"{sizes[-1] / sum(sizes[:-1]):6.1f}" if sizes else "     1"
+    print(
+        f"{name:<22} {len(latencies) / total_time:8.1f} req/s  "
+        f"p50 {percentile(latencies, 0.5) * 1000:7.1f}ms  "
+        f"p99 {percentile(latencies, 0.99) * 1000:7.1f}ms  "
+        f"mean batch {batches}"
+    )
+
+
+async def main(clients, requests, model):
+    # Batching is done here rather than by the pool, to compare variants
+    pool = InferencePool(
+        "benchmark", __file__, "load_model", args=(model,), workers=1, batch_size=1
+    )
+    await pool.start()
+    try:
+        print(f"{clients} clients x {requests} requests, model {model}")
+        await run("unbatched", pool.infer, clients, requests)
+        for name, max_wait, max_padding in [
+            ("batched", 0.005, 4.0),
+            ("batched, no wait", 0.0, 4.0),
+            ("batched, no grouping", 0.005, float("inf")),
+        ]:
+            batcher = MicroBatcher(
+                name, pool.infer, max_wait, 32, max_padding=max_padding
+            )
+            await run(name, batcher.submit, clients, requests)
+    finally:
+        await pool.stop()
+
+
+if __name__ == "__main__":
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    model = sys.argv[3] if len(sys.argv) > 3 else "synthetic"
+    asyncio.run(main(clients, requests, model))
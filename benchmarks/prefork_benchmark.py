@@ -0,0 +1,205 @@
+"""
+Compares startup time and memory of `uvicorn main:app --workers N`, where
+every worker loads the pipelines itself, with utils.pipelines.prefork, where
+they are loaded once and shared copy-on-write by the forked workers.
+
+The pipelines directory holds one synthetic filter whose on_startup loads a
+"model": a vocabulary of small Python objects and a buffer of weights. After
+startup, every server is sent some requests, then the proportional (PSS) and
+private (USS) memory of all of its processes is read from /proc (Linux only).
+
+Usage: python -m benchmarks.prefork_benchmark [workers] [model_mb]
+"""
+
+import http.client
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+
+API_KEY = "0p3n-w3bu!"
+PORT = 9199
+REQUESTS = 200
+
+PIPELINE = '''
+from typing import List, Optional
+from pydantic import BaseModel
+import os
+
+
+class Pipeline:
+    class Valves(BaseModel):
+        pipelines: List[str] = ["*"]
+        priority: int = 0
+
+    def __init__(self):
+        self.type = "filter"
+        self.name = "Synthetic Model Filter"
+        self.valves = self.Valves()
+
+    async def on_startup(self):
+        self.vocab = {{f"token-{{i}}": i for i in range(200_000)}}
+        self.weights = bytearray(b"\\x01" * ({model_mb} * 1024 * 1024))
+        open(os.path.join(os.environ["BENCHMARK_MARKERS"], str(os.getpid())), "w")
+
+    async def inlet(self, body: dict, user: Optional[dict] = None) -> dict:
+        text = body["messages"][-1]["content"]
+        score = sum(self.vocab.get(word, 0) for word in text.split())
+        body["score"] = score + self.weights[score % len(self.weights)]
+        return body
+'''
+
+
+def descendants(pid):
+    parents = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    stat = f.read()
+            except OSError:
+                continue
+            ppid = int(stat.rsplit(")", 1)[1].split()[1])
+            parents.setdefault(ppid, []).append(int(entry))
+
+    pids, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        pids.append(current)
+        pending.extend(parents.get(current, []))
+    return pids
+
+
+def memory_kb(pid):
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    uss = fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    return fields.get("Rss", 0), fields.get("Pss", 0), uss
+
+
+def request(method, path, body=None):
+    connection = http.client.HTTPConnection("127.0.0.1", PORT, timeout=5)
+    try:
+        connection.request(
+            method,
+            path,
+            body=body,
+            headers={
+                "Authorization": f"Bearer {API_KEY}",
+                "Content-Type": "application/json",
+            },
+        )
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    finally:
+        connection.close()
+
+
+def wait_ready(process, workers, markers, loads, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            # Every process that loads the model has done so, and there are
+            # as many workers as requested
+            if (
+                len(os.listdir(markers)) >= loads
+                and len(descendants(process.pid)) > workers
+                and request("GET", "/ready") == 200
+            ):
+                return
+        except OSError:
+            pass
+        time.sleep(0.05)
+    raise TimeoutError("Server did not become ready")
+
+
+def run(name, command, workers, loads, pipelines_dir):
+    markers = tempfile.mkdtemp()
+    env = dict(
+        os.environ,
+        BENCHMARK_MARKERS=markers,
+        PIPELINES_DIR=pipelines_dir,
+        PIPELINES_API_KEY=API_KEY,
+        DD_TRACE_ENABLED="false",
+    )
+    start_time = time.perf_counter()
+    process = subprocess.Popen(
+        command,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    try:
+        wait_ready(process, workers, markers, loads)
+        startup_time = time.perf_counter() - start_time
+
+        body = '{"body": {"messages": [{"role": "user", "content": "token-42"}]}}'
+        start_time = time.perf_counter()
+        for _ in range(REQUESTS):
+            request("POST", "/synthetic_model_filter/filter/inlet", body)
+        request_time = time.perf_counter() - start_time
+
+        rss = pss = uss = 0
+        for pid in descendants(process.pid):
+            process_rss, process_pss, process_uss = memory_kb(pid)
+            rss += process_rss
+            pss += process_pss
+            uss += process_uss
+    finally:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait()
+        shutil.rmtree(markers)
+
+    print(
+        f"{name:<10} startup {startup_time:6.2f}s  "
+        f"{REQUESTS / request_time:7.0f} req/s  "
+        f"rss {rss / 1024:7.1f}MB  pss {pss / 1024:7.1f}MB  uss {uss / 1024:7.1f}MB"
+    )
+
+
+if __name__ == "__main__":
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    model_mb = int(sys.argv[2]) if len(sys.argv) > 2 else 256
+
+    pipelines_dir = tempfile.mkdtemp()
+    try:
+        with open(os.path.join(pipelines_dir, "synthetic_model_filter.py"), "w") as f:
+            f.write(PIPELINE.format(model_mb=model_mb))
+
+        print(f"{workers} workers, {model_mb}MB model, memory summed over all processes")
+        server_args = ["--host", "127.0.0.1", "--port", str(PORT)]
+        run(
+            "uvicorn",
+            ["uvicorn", "main:app", "--workers", str(workers), *server_args],
+            workers,
+            workers,
+            pipelines_dir,
+        )
+        run(
+            "prefork",
+            [
+                sys.executable,
+                "-m",
+                "utils.pipelines.prefork",
+                "--workers",
+                str(workers),
+                *server_args,
+            ],
+            workers,
+            1,
+            pipelines_dir,
+        )
+    finally:
+        shutil.rmtree(pipelines_dir)
@@ -0,0 +1,55 @@
+"""
+Compares the per-chunk cost of the previous SSE encoding in stream_content
+(stream_message_template + json.dumps + f-strings + logging.info) with
+utils.pipelines.sse.ChunkEncoder.
+
+Usage: python -m benchmarks.sse_encoder_benchmark [chunks]
+"""
+
+import json
+import logging
+import sys
+import time
+
+from utils.pipelines.main import stream_message_template
+from utils.pipelines.sse import ChunkEncoder
+
+
+MODEL = "openai_manifold_pipeline.gpt-4o"
+DELTAS = ["Hello", ",", " world", "!", " How", " can", " I", " help", " you", "?"]
+
+
+def legacy(chunks):
+    for i in range(chunks):
+        line = DELTAS[i % len(DELTAS)]
+        logging.info(f"stream_content:Generator:{line}")
+        line = stream_message_template(MODEL, line)
+        yield f"data: {json.dumps(line)}\n\n".encode("utf-8")
+
+
+def encoder(chunks):
+    encoder = ChunkEncoder(MODEL)
+    for i in range(chunks):
+        yield encoder.delta(DELTAS[i % len(DELTAS)])
+
+
+def run(name, fn, chunks):
+    start_time = time.perf_counter()
+    size = sum(len(chunk) for chunk in fn(chunks))
+    elapsed = time.perf_counter() - start_time
+    print(
+        f"{name:>8}: {chunks / elapsed:>12,.0f} chunks/s "
+        f"({elapsed / chunks * 1e6:.2f} us/chunk, {size / chunks:.0f} bytes/chunk)"
+    )
+    return chunks / elapsed
+
+
+if __name__ == "__main__":
+    chunks = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    # The root logger stays at WARNING under uvicorn, but the f-string passed
+    # to logging.info was still formatted for every chunk
+    logging.basicConfig(level=logging.WARNING)
+
+    before = run("before", legacy, chunks)
+    after = run("after", encoder, chunks)
+    print(f"speedup: {after / before:.1f}x")
@@ -13,3 +13,90 @@ except ImportError:
 
 API_KEY = os.getenv("PIPELINES_API_KEY", "0p3n-w3bu!")
 PIPELINES_DIR = os.getenv("PIPELINES_DIR", "./pipelines")
+
+# Manifold model catalogs are refreshed in the background every N seconds
+CATALOG_REFRESH_INTERVAL = float(os.getenv("PIPELINES_CATALOG_REFRESH_INTERVAL", "300"))
+CATALOG_REFRESH_TIMEOUT = float(os.getenv("PIPELINES_CATALOG_REFRESH_TIMEOUT", "30"))
+
+# Number of pipeline modules imported and started concurrently
+PIPELINES_LOAD_CONCURRENCY = int(os.getenv("PIPELINES_LOAD_CONCURRENCY", "4"))
+
+# Pipelines whose on_startup is deferred until warmed ("*" for all)
+LAZY_PIPELINES = [
+    pipeline_id.strip()
+    for pipeline_id in os.getenv("PIPELINES_LAZY", "").split(",")
+    if pipeline_id.strip()
+]
+# "background" warms lazy pipelines right after startup, "on_demand" on first use
+LAZY_WARMUP = os.getenv("PIPELINES_LAZY_WARMUP", "background")
+# Seconds a request waits for a pipeline that is still warming; 0 fails fast
+READY_TIMEOUT = float(os.getenv("PIPELINES_READY_TIMEOUT", "30"))
+
+# Requests allowed inside one pipeline at once (0 = unlimited) and how many
+# more may queue before the server answers 429
+MAX_CONCURRENCY = int(os.getenv("PIPELINES_MAX_CONCURRENCY", "0"))
+MAX_QUEUE = int(os.getenv("PIPELINES_MAX_QUEUE", "64"))
+# Per-pipeline overrides, e.g. "document_classifier_pipeline=4:8,nsfw_filter_pipeline=2"
+CONCURRENCY_LIMITS = os.getenv("PIPELINES_CONCURRENCY_LIMITS", "")
+# Retry-After (seconds) sent with 429 responses
+RETRY_AFTER = os.getenv("PIPELINES_RETRY_AFTER", "1")
+
+# Opt-in coalescing of streamed deltas: merge them into one SSE event until
+# this many bytes are buffered (0 = off) or the interval has passed
+STREAM_COALESCE_BYTES = int(os.getenv("PIPELINES_STREAM_COALESCE_BYTES", "0"))
+STREAM_COALESCE_INTERVAL_MS = float(
+    os.getenv("PIPELINES_STREAM_COALESCE_INTERVAL_MS", "20")
+)
+# Seconds to wait for a pipe's generator to close after the client disconnects
+STREAM_CLOSE_TIMEOUT = float(os.getenv("PIPELINES_STREAM_CLOSE_TIMEOUT", "5"))
+
+# Fraction of traces that get per-pipeline spans (inlet/outlet/pipe/inference)
+TRACE_SAMPLE_RATE = float(os.getenv("PIPELINES_TRACE_SAMPLE_RATE", "1.0"))
+
+# The event loop counts as blocked when its heartbeat (every interval) is late
+# by more than the threshold; stalls are logged and counted per pipeline.
+# A threshold of 0 disables the monitor.
+LOOP_LAG_INTERVAL_MS = float(os.getenv("PIPELINES_LOOP_LAG_INTERVAL_MS", "50"))
+LOOP_LAG_THRESHOLD_MS = float(os.getenv("PIPELINES_LOOP_LAG_THRESHOLD_MS", "100"))
+
+# Threads running the hooks of blocking filter pipelines off the event loop
+# (defaults to the same size as a ThreadPoolExecutor)
+HOOK_WORKERS = int(
+    os.getenv("PIPELINES_HOOK_WORKERS", str(min(32, (os.cpu_count() or 1) + 4)))
+)
+
+# Pre-forked server processes (see utils/pipelines/prefork.py); pipelines are
+# loaded once in the parent and shared copy-on-write by the workers
+WORKERS = int(os.getenv("PIPELINES_WORKERS", "1"))
+
+# Processes per pipeline that host its models (see utils/pipelines/inference.py)
+# and the intra-op threads each of them may use (0 = the library's default)
+INFERENCE_WORKERS = int(os.getenv("PIPELINES_INFERENCE_WORKERS", "1"))
+INFERENCE_THREADS = int(os.getenv("PIPELINES_INFERENCE_THREADS", "0"))
+
+# Seconds a reload waits for requests still using a replaced or removed
+# pipeline before shutting it down anyway
+DRAIN_TIMEOUT = float(os.getenv("PIPELINES_DRAIN_TIMEOUT", "60"))
+
+# How /perform_filters runs the enabled filters by default: "sequential" stops
+# at the first rejection, "concurrent" starts them all and cancels the rest on
+# the first rejection, "collect" runs them all and reports every rejection
+FILTERS_MODE = os.getenv("PIPELINES_FILTERS_MODE", "sequential")
+# "adaptive" runs sequential filters cheapest per rejection first (see
+# utils/pipelines/ordering.py), "listed" in the order of enabled_filters.
+# Pipelines' cost_hint is used until a filter has this many samples.
+FILTERS_ORDER = os.getenv("PIPELINES_FILTERS_ORDER", "adaptive")
+FILTERS_ORDER_MIN_SAMPLES = int(os.getenv("PIPELINES_FILTERS_ORDER_MIN_SAMPLES", "20"))
+
+# Cross-request micro-batching of inference calls (see utils/pipelines/batching.py):
+# inputs of concurrent requests are merged into batches of at most this many
+# inputs (1 = off). Inputs always collect while the workers are busy; a wait
+# above 0 also holds them back for up to that many milliseconds when a worker
+# is free, which only pays off with several workers under bursty load.
+INFERENCE_BATCH_SIZE = int(os.getenv("PIPELINES_INFERENCE_BATCH_SIZE", "32"))
+INFERENCE_BATCH_WAIT_MS = float(os.getenv("PIPELINES_INFERENCE_BATCH_WAIT_MS", "0"))
+
+# Verdicts of cacheable filters (see utils/pipelines/verdicts.py) kept for
+# repeated perform_filters inputs; 0 entries or a TTL of 0 seconds turns it off
+VERDICT_CACHE_SIZE = int(os.getenv("PIPELINES_VERDICT_CACHE_SIZE", "10000"))
+VERDICT_CACHE_TTL = float(os.getenv("PIPELINES_VERDICT_CACHE_TTL", "300"))
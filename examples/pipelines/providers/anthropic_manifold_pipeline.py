@@ -145,26 +145,27 @@ class Pipeline:
             return f"Error: {e}"
 
     def stream_response(self, payload: dict) -> Generator:
-        response = requests.post(self.url, headers=self.headers, json=payload, stream=True)
-
-        if response.status_code == 200:
-            client = sseclient.SSEClient(response)
-            for event in client.events():
-                try:
-                    data = json.loads(event.data)
-                    if data["type"] == "content_block_start":
-                        yield data["content_block"]["text"]
-                    elif data["type"] == "content_block_delta":
-                        yield data["delta"]["text"]
-                    elif data["type"] == "message_stop":
-                        break
-                except json.JSONDecodeError:
-                    print(f"Failed to parse JSON: {event.data}")
-                except KeyError as e:
-                    print(f"Unexpected data structure: {e}")
-                    print(f"Full data: {data}")
-        else:
-            raise Exception(f"Error: {response.status_code} - {response.text}")
+        # The response is closed when the generator is, e.g. when the client
+        # disconnects mid-stream
+        with requests.post(self.url, headers=self.headers, json=payload, stream=True) as response:
+            if response.status_code == 200:
+                client = sseclient.SSEClient(response)
+                for event in client.events():
+                    try:
+                        data = json.loads(event.data)
+                        if data["type"] == "content_block_start":
+                            yield data["content_block"]["text"]
+                        elif data["type"] == "content_block_delta":
+                            yield data["delta"]["text"]
+                        elif data["type"] == "message_stop":
+                            break
+                    except json.JSONDecodeError:
+                        print(f"Failed to parse JSON: {event.data}")
+                    except KeyError as e:
+                        print(f"Unexpected data structure: {e}")
+                        print(f"Full data: {data}")
+            else:
+                raise Exception(f"Error: {response.status_code} - {response.text}")
 
     def get_completion(self, payload: dict) -> str:
         response = requests.post(self.url, headers=self.headers, json=payload)
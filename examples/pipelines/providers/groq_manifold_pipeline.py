@@ -29,7 +29,6 @@ class Pipeline:
             }
         )
 
-        self.pipelines = self.get_models()
         pass
 
     async def on_startup(self):
@@ -45,9 +44,11 @@ class Pipeline:
     async def on_valves_updated(self):
         # This function is called when the valves are updated.
         print(f"on_valves_updated:{__name__}")
-        self.pipelines = self.get_models()
         pass
 
+    def pipelines(self):
+        return self.get_models()
+
     def get_models(self):
         if self.valves.GROQ_API_KEY:
             try:
@@ -71,12 +72,7 @@ class Pipeline:
             except Exception as e:
 
                 print(f"Error: {e}")
-                return [
-                    {
-                        "id": "error",
-                        "name": "Could not fetch models from Groq, please update the API Key in the valves.",
-                    },
-                ]
+                raise
         else:
             return []
 
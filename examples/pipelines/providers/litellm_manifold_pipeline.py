@@ -46,15 +46,11 @@ class Pipeline:
                 "LITELLM_PIPELINE_DEBUG": os.getenv("LITELLM_PIPELINE_DEBUG", False),
             }
         )
-        # Get models on initialization
-        self.pipelines = self.get_litellm_models()
         pass
 
     async def on_startup(self):
         # This function is called when the server is started.
         print(f"on_startup:{__name__}")
-        # Get models on startup
-        self.pipelines = self.get_litellm_models()
         pass
 
     async def on_shutdown(self):
@@ -65,9 +61,11 @@ class Pipeline:
     async def on_valves_updated(self):
         # This function is called when the valves are updated.
 
-        self.pipelines = self.get_litellm_models()
         pass
 
+    def pipelines(self):
+        return self.get_litellm_models()
+
     def get_litellm_models(self):
 
         headers = {}
@@ -89,12 +87,7 @@ class Pipeline:
                 ]
             except Exception as e:
                 print(f"Error fetching models from LiteLLM: {e}")
-                return [
-                    {
-                        "id": "error",
-                        "name": "Could not fetch models from LiteLLM, please update the URL in the valves.",
-                    },
-                ]
+                raise
         else:
             print("LITELLM_BASE_URL not set. Please configure it in the valves.")
             return []
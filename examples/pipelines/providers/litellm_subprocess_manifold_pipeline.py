@@ -45,6 +45,9 @@ class Pipeline:
         # Initialize Valves
         self.valves = self.Valves(**{"LITELLM_CONFIG_DIR": f"./litellm/config.yaml"})
         self.background_process = None
+        # on_startup starts the LiteLLM proxy in a task that must outlive it,
+        # so it runs on the server's event loop
+        self.blocking = False
         pass
 
     async def on_startup(self):
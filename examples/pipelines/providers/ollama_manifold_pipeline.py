@@ -31,13 +31,11 @@ class Pipeline:
                 "OLLAMA_BASE_URL": os.getenv("OLLAMA_BASE_URL", "http://localhost:11435"),
             }
         )
-        self.pipelines = []
         pass
 
     async def on_startup(self):
         # This function is called when the server is started.
         print(f"on_startup:{__name__}")
-        self.pipelines = self.get_ollama_models()
         pass
 
     async def on_shutdown(self):
@@ -48,9 +46,11 @@ class Pipeline:
     async def on_valves_updated(self):
         # This function is called when the valves are updated.
         print(f"on_valves_updated:{__name__}")
-        self.pipelines = self.get_ollama_models()
         pass
 
+    def pipelines(self):
+        return self.get_ollama_models()
+
     def get_ollama_models(self):
         if self.valves.OLLAMA_BASE_URL:
             try:
@@ -62,12 +62,7 @@ class Pipeline:
                 ]
             except Exception as e:
                 print(f"Error: {e}")
-                return [
-                    {
-                        "id": "error",
-                        "name": "Could not fetch models from Ollama, please update the URL in the valves.",
-                    },
-                ]
+                raise
         else:
             return []
 
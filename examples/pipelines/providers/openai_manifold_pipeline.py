@@ -29,7 +29,6 @@ class Pipeline:
             }
         )
 
-        self.pipelines = self.get_openai_models()
         pass
 
     async def on_startup(self):
@@ -45,9 +44,11 @@ class Pipeline:
     async def on_valves_updated(self):
         # This function is called when the valves are updated.
         print(f"on_valves_updated:{__name__}")
-        self.pipelines = self.get_openai_models()
         pass
 
+    def pipelines(self):
+        return self.get_openai_models()
+
     def get_openai_models(self):
         if self.valves.OPENAI_API_KEY:
             try:
@@ -72,12 +73,7 @@ class Pipeline:
             except Exception as e:
 
                 print(f"Error: {e}")
-                return [
-                    {
-                        "id": "error",
-                        "name": "Could not fetch models from OpenAI, please update the API Key in the valves.",
-                    },
-                ]
+                raise
         else:
             return []
 
@@ -116,8 +112,16 @@ class Pipeline:
             r.raise_for_status()
 
             if body["stream"]:
-                return r.iter_lines()
+                return self.stream_lines(r)
             else:
                 return r.json()
         except Exception as e:
             return f"Error: {e}"
+
+    def stream_lines(self, r: requests.Response) -> Generator:
+        # Closing the generator (e.g. when the client disconnects) also closes
+        # the upstream response instead of reading it to the end
+        try:
+            yield from r.iter_lines()
+        finally:
+            r.close()
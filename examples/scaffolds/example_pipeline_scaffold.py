@@ -54,6 +54,10 @@ class Pipeline:
         self, user_message: str, model_id: str, messages: List[dict], body: dict
     ) -> Union[str, Generator, Iterator]:
         # This is where you can add your custom pipelines like RAG.
+        # pipe can also be declared `async def` (returning a str or an async
+        # generator), in which case it runs on the event loop instead of the
+        # threadpool. Use it with async HTTP clients only; blocking calls in an
+        # async pipe stall every other request.
         print(f"pipe:{__name__}")
 
         # If you'd like to check for title generation, you can add the following check
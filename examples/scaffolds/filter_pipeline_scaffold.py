@@ -42,10 +42,29 @@ class Pipeline:
 
         self.valves = self.Valves(**{"pipelines": ["llama3:latest"]})
 
+        # Optionally, declare whether inlet/outlet block (e.g. run model inference or use `requests`).
+        # Blocking hooks run on a dedicated thread pool, each thread with its own event loop, instead of
+        # the server's event loop. If it is not set, hooks are moved there once they are caught blocking it.
+        # Set it to False to always run on the server's event loop, e.g. if the hooks use an aiohttp session
+        # created in on_startup. Sync hooks always run on the thread pool.
+        # Models can also be hosted in separate processes with utils.pipelines.inference.InferencePool
+        # (see pipelines/nsfw_filter_pipeline.py), in which case the hooks do not block.
+        # self.blocking = True
+
+        # Optionally, give the expected duration of inlet in seconds.
+        # /perform_filters runs cheap filters first until it has measured their actual latency and rejection rate.
+        # self.cost_hint = 0.01
+
+        # Optionally, let /perform_filters cache verdicts on repeated input.
+        # Only set it if inlet looks at nothing but body["text"] or the last user message, plus the valves and request config keys listed here (None for all of them).
+        # self.verdict_cache = {"valves": ["threshold"], "config": []}
+
         pass
 
     async def on_startup(self):
         # This function is called when the server is started.
+        # It runs on its own event loop in a worker thread, so it can load models synchronously,
+        # but tasks it creates end with it. Set self.blocking = False to run it on the server's event loop.
         print(f"on_startup:{__name__}")
         pass
 
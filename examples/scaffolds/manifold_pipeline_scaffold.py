@@ -20,6 +20,10 @@ class Pipeline:
 
         # Define pipelines that are available in this manifold pipeline.
         # This is a list of dictionaries where each dictionary has an id and name.
+        # It can also be a method returning such a list, e.g. to fetch the models
+        # from an upstream API. The server then calls it in the background, on
+        # startup, every PIPELINES_CATALOG_REFRESH_INTERVAL seconds and after the
+        # valves are updated. If it raises, the last list it returned is kept.
         self.pipelines = [
             {
                 "id": "pipeline-1",  # This will turn into `manifold_pipeline.pipeline-1`
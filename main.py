@@ -1,39 +1,114 @@
 from fastapi import FastAPI, Request, Depends, status, HTTPException, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.concurrency import run_in_threadpool
+from fastapi.concurrency import run_in_threadpool, iterate_in_threadpool
 
 
-from starlette.responses import StreamingResponse, Response
+from starlette.responses import StreamingResponse, Response, JSONResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel, ConfigDict
-from typing import List, Union, Generator, Iterator, Optional
+from typing import (
+    List,
+    Union,
+    Generator,
+    Iterator,
+    AsyncGenerator,
+    AsyncIterator,
+    Optional,
+)
 
 
 from utils.pipelines.auth import bearer_security, get_current_user
-from utils.pipelines.main import get_last_user_message, stream_message_template
+from utils.pipelines.main import get_last_user_message
 from utils.pipelines.misc import convert_to_raw_url
+from utils.pipelines.registry import InFlight, build_snapshot, etag_matches
+from utils.pipelines.sse import ChunkEncoder, coalesce_deltas
+from utils.pipelines.streams import StreamTracker, close_upstream
+from utils.pipelines.timing import ServerTimingMiddleware, mark, record, timed
+from utils.pipelines.tracing import (
+    trace_cache_hit,
+    trace_hook,
+    configure as configure_tracing,
+)
+from utils.pipelines.metrics import (
+    METRICS,
+    HOOK_DURATION,
+    FILTER_REJECTIONS,
+    STREAM_CHUNKS,
+    STREAM_FIRST_CHUNK,
+)
+from utils.pipelines.catalog import ManifoldCatalog
+from utils.pipelines.looplag import LoopLagMonitor
+from utils.pipelines.offload import HookExecutor
+from utils.pipelines.jobs import ReloadQueue
+from utils.pipelines.ordering import FilterOrdering
+from utils.pipelines.verdicts import VerdictCache, verdict_key
+from utils.pipelines.inference import InferenceError, resume_pools, suspend_pools
+from utils.pipelines.bulkhead import Bulkhead, BulkheadFull, parse_limits
+from utils.pipelines.requirements import (
+    install_requirements,
+    parse_requirements,
+    read_frontmatter,
+)
+from utils.pipelines.readiness import (
+    ReadinessTracker,
+    PipelineNotReady,
+    COLD,
+    READY,
+)
 
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, contextmanager
 from concurrent.futures import ThreadPoolExecutor
 from schemas import FilterForm, OpenAIChatCompletionForm
 from urllib.parse import urlparse
 
 import shutil
 import aiohttp
+import anyio
+import asyncio
 import os
 import importlib.util
+import inspect
+import hashlib
 import logging
 import time
 import json
 import uuid
-import sys
-import subprocess
-
-
-from config import API_KEY, PIPELINES_DIR
+import threading
+import weakref
+
+
+from config import (
+    API_KEY,
+    PIPELINES_DIR,
+    CATALOG_REFRESH_INTERVAL,
+    CATALOG_REFRESH_TIMEOUT,
+    PIPELINES_LOAD_CONCURRENCY,
+    LAZY_PIPELINES,
+    LAZY_WARMUP,
+    READY_TIMEOUT,
+    MAX_CONCURRENCY,
+    MAX_QUEUE,
+    CONCURRENCY_LIMITS,
+    RETRY_AFTER,
+    STREAM_COALESCE_BYTES,
+    STREAM_COALESCE_INTERVAL_MS,
+    STREAM_CLOSE_TIMEOUT,
+    TRACE_SAMPLE_RATE,
+    LOOP_LAG_INTERVAL_MS,
+    LOOP_LAG_THRESHOLD_MS,
+    HOOK_WORKERS,
+    DRAIN_TIMEOUT,
+    FILTERS_MODE,
+    FILTERS_ORDER,
+    FILTERS_ORDER_MIN_SAMPLES,
+    VERDICT_CACHE_SIZE,
+    VERDICT_CACHE_TTL,
+)
 
 from ddtrace import patch_all
 # Initialize ddtrace
 patch_all()
+configure_tracing(TRACE_SAMPLE_RATE)
 
 if not os.path.exists(PIPELINES_DIR):
     os.makedirs(PIPELINES_DIR)
@@ -43,6 +118,208 @@ PIPELINES = {}
 PIPELINE_MODULES = {}
 PIPELINE_NAMES = {}
 
+# Per-module load and startup durations in seconds
+PIPELINE_TIMINGS = {}
+
+# (content hash, valves.json mtime) of each loaded module file, see reload()
+MODULE_SOURCES = {}
+
+# Pipeline modules are imported and started concurrently on this pool
+LOAD_EXECUTOR = ThreadPoolExecutor(
+    max_workers=PIPELINES_LOAD_CONCURRENCY, thread_name_prefix="pipelines-load"
+)
+REQUIREMENTS_LOCK = threading.Lock()
+
+# Set by preload() when the pipelines were started before the server, in the
+# parent of pre-forked workers (see utils/pipelines/prefork.py)
+PRELOADED = False
+
+# Per-pipeline concurrency limits, see get_bulkhead()
+BULKHEADS = {}
+BULKHEAD_LIMITS = parse_limits(CONCURRENCY_LIMITS)
+
+# Completed and client-aborted chat streams per pipeline
+STREAMS = StreamTracker()
+
+# Warm state of each pipeline, see start_module() and /ready
+READINESS = ReadinessTracker(start=lambda pipeline_id: start_module(pipeline_id))
+
+# Current immutable registry snapshot, see rebuild_registry()
+REGISTRY = None
+
+# Requests running on each module instance, see pipeline_slot() and reload()
+INFLIGHT = InFlight()
+# Replaced instances waiting for their requests to finish before shutdown
+RETIRING = set()
+# Reloads must not interleave
+RELOAD_LOCK = asyncio.Lock()
+# Latency and rejection rate of each filter, see perform_filters()
+FILTER_ORDERING = FilterOrdering(min_samples=FILTERS_ORDER_MIN_SAMPLES)
+# Verdicts of filters on repeated inputs, see run_filter()
+VERDICTS = VerdictCache(VERDICT_CACHE_SIZE, VERDICT_CACHE_TTL)
+
+# Reloads requested by the admin endpoints, run in the background
+RELOADS = ReloadQueue(lambda job: reload(full=job.full, job=job))
+
+# Model lists of manifolds with a `pipelines()` function, refreshed in the
+# background instead of on the request path
+CATALOG = ManifoldCatalog(
+    interval=CATALOG_REFRESH_INTERVAL,
+    timeout=CATALOG_REFRESH_TIMEOUT,
+    on_change=lambda: rebuild_registry(),
+)
+
+
+def pipeline_for_file(filename):
+    """
+    Maps a source file to the id of the pipeline module loaded from it.
+    """
+    directory, name = os.path.split(os.path.abspath(filename))
+    if directory != os.path.abspath(PIPELINES_DIR) or not name.endswith(".py"):
+        return None
+    for pipeline_id, module_name in list(PIPELINE_NAMES.items()):
+        if f"{module_name}.py" == name:
+            return pipeline_id
+    return None
+
+
+# Hooks of blocking pipelines run on this pool instead of the event loop
+HOOK_EXECUTOR = HookExecutor(max_workers=HOOK_WORKERS)
+
+# Instances that did not declare `blocking` but were caught blocking the loop
+BLOCKING_DETECTED = weakref.WeakSet()
+
+
+def on_loop_stall(pipeline_id, duration):
+    pipeline = PIPELINE_MODULES.get(pipeline_id)
+    if pipeline is None or getattr(pipeline, "blocking", None) is not None:
+        return
+    if pipeline not in BLOCKING_DETECTED:
+        BLOCKING_DETECTED.add(pipeline)
+        logging.warning(
+            f"Running the hooks of {pipeline_id} off the event loop from now on; "
+            f"set `blocking = False` on it to keep them on the loop"
+        )
+
+
+# Reports pipelines that block the event loop, e.g. with sync inference
+LOOP_MONITOR = LoopLagMonitor(
+    interval=LOOP_LAG_INTERVAL_MS / 1000,
+    threshold=LOOP_LAG_THRESHOLD_MS / 1000,
+    resolve=pipeline_for_file,
+    on_stall=on_loop_stall,
+)
+
+
+# Metrics read from the state above whenever /metrics is scraped
+def collect_threadpool(attribute):
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    return [((), getattr(limiter, attribute))]
+
+
+def collect_bulkheads(attribute):
+    return [
+        ((pipeline_id,), getattr(bulkhead, attribute))
+        for pipeline_id, bulkhead in BULKHEADS.items()
+    ]
+
+
+def collect_timings(stage):
+    return [
+        ((pipeline_id,), timings[stage])
+        for pipeline_id, timings in PIPELINE_TIMINGS.items()
+        if stage in timings
+    ]
+
+
+def collect_streams():
+    return [
+        ((pipeline_id, outcome), stats[outcome])
+        for pipeline_id, stats in STREAMS.status().items()
+        for outcome in ("completed", "aborted")
+    ]
+
+
+METRICS.collected(
+    "pipelines_threadpool_busy_threads",
+    "Threadpool threads running sync pipes and hooks",
+    (),
+    lambda: collect_threadpool("borrowed_tokens"),
+)
+METRICS.collected(
+    "pipelines_threadpool_max_threads",
+    "Size of the threadpool",
+    (),
+    lambda: collect_threadpool("total_tokens"),
+)
+METRICS.collected(
+    "pipelines_hook_executor_busy_threads",
+    "Threads running the hooks of blocking pipelines",
+    (),
+    lambda: [((), HOOK_EXECUTOR.active)],
+)
+METRICS.collected(
+    "pipelines_hook_executor_max_threads",
+    "Size of the pool running the hooks of blocking pipelines",
+    (),
+    lambda: [((), HOOK_EXECUTOR.max_workers)],
+)
+METRICS.collected(
+    "pipelines_bulkhead_active",
+    "Requests running inside each pipeline",
+    ("pipeline",),
+    lambda: collect_bulkheads("active"),
+)
+METRICS.collected(
+    "pipelines_bulkhead_queued",
+    "Requests queued for each pipeline",
+    ("pipeline",),
+    lambda: collect_bulkheads("queued"),
+)
+METRICS.collected(
+    "pipelines_bulkhead_rejected_total",
+    "Requests rejected with 429 because a pipeline's queue was full",
+    ("pipeline",),
+    lambda: collect_bulkheads("rejected"),
+    type="counter",
+)
+METRICS.collected(
+    "pipelines_bulkhead_queue_wait_seconds_total",
+    "Time requests spent queued for each pipeline",
+    ("pipeline",),
+    lambda: collect_bulkheads("queue_wait_total"),
+    type="counter",
+)
+METRICS.collected(
+    "pipelines_module_load_seconds",
+    "Time taken to import each pipeline module",
+    ("pipeline",),
+    lambda: collect_timings("load"),
+)
+METRICS.collected(
+    "pipelines_module_startup_seconds",
+    "Time taken by each pipeline's on_startup",
+    ("pipeline",),
+    lambda: collect_timings("startup"),
+)
+METRICS.collected(
+    "pipelines_streams_total",
+    "Chat streams that completed or were aborted by the client",
+    ("pipeline", "outcome"),
+    collect_streams,
+    type="counter",
+)
+METRICS.collected(
+    "pipelines_stream_tokens_saved_total",
+    "Estimated upstream tokens saved by closing aborted streams",
+    ("pipeline",),
+    lambda: [
+        ((pipeline_id,), stats["tokens_saved"])
+        for pipeline_id, stats in STREAMS.status().items()
+    ],
+    type="counter",
+)
+
 
 def get_all_pipelines():
     pipelines = {}
@@ -55,7 +332,7 @@ def get_all_pipelines():
 
                 # Check if pipelines is a function or a list
                 if callable(pipeline.pipelines):
-                    manifold_pipelines = pipeline.pipelines()
+                    manifold_pipelines = CATALOG.get(pipeline_id)
                 else:
                     manifold_pipelines = pipeline.pipelines
 
@@ -111,44 +388,75 @@ def get_all_pipelines():
     return pipelines
 
 
-def parse_frontmatter(content):
-    frontmatter = {}
-    for line in content.split("\n"):
-        if ":" in line:
-            key, value = line.split(":", 1)
-            frontmatter[key.strip().lower()] = value.strip()
-    return frontmatter
+def render_models(pipelines, created):
+    return {
+        "data": [
+            {
+                "id": pipeline["id"],
+                "name": pipeline["name"],
+                "object": "model",
+                "created": created,
+                "owned_by": "openai",
+                "pipeline": {
+                    "type": pipeline["type"],
+                    **(
+                        {
+                            "pipelines": (
+                                pipeline["valves"].pipelines
+                                if pipeline.get("valves", None)
+                                else []
+                            ),
+                            "priority": pipeline.get("priority", 0),
+                        }
+                        if pipeline.get("type", "pipe") == "filter"
+                        else {}
+                    ),
+                    "valves": pipeline["valves"] != None,
+                },
+            }
+            for pipeline in pipelines.values()
+        ],
+        "object": "list",
+        "pipelines": True,
+    }
+
+
+def rebuild_registry():
+    """
+    Rebuilds the registry snapshot from the loaded modules.
 
+    Must be called whenever PIPELINE_MODULES or a module's valves change;
+    request handlers only read the current snapshot.
+    """
+    global PIPELINES
+    global REGISTRY
 
-def install_frontmatter_requirements(requirements):
-    if requirements:
-        req_list = [req.strip() for req in requirements.split(",")]
-        for req in req_list:
-            print(f"Installing requirement: {req}")
-            subprocess.check_call([sys.executable, "-m", "pip", "install", req])
-    else:
-        print("No requirements found in frontmatter.")
+    version = REGISTRY.version + 1 if REGISTRY else 1
+    REGISTRY = build_snapshot(version, get_all_pipelines(), render_models)
+    PIPELINES = REGISTRY.pipelines
 
+    app.state.REGISTRY = REGISTRY
+    app.state.PIPELINES = PIPELINES
+    logging.info(f"Rebuilt pipeline registry: version {REGISTRY.version}")
 
-async def load_module_from_path(module_name, module_path):
+    return REGISTRY
 
-    try:
-        # Read the module content
-        with open(module_path, "r") as file:
-            content = file.read()
-
-        # Parse frontmatter
-        frontmatter = {}
-        if content.startswith('"""'):
-            end = content.find('"""', 3)
-            if end != -1:
-                frontmatter_content = content[3:end]
-                frontmatter = parse_frontmatter(frontmatter_content)
-
-        # Install requirements if specified
-        if "requirements" in frontmatter:
-            install_frontmatter_requirements(frontmatter["requirements"])
 
+def install_requirements_locked(requirement_sets):
+    # pip must not run concurrently against the same environment
+    with REQUIREMENTS_LOCK:
+        start_time = time.perf_counter()
+        installed = install_requirements(requirement_sets)
+        if installed:
+            install_time = time.perf_counter() - start_time
+            logging.info(
+                f"Installed {len(installed)} requirements in {install_time:.2f}s"
+            )
+
+
+def load_module_from_path(module_name, module_path):
+
+    try:
         # Load the module
         spec = importlib.util.spec_from_file_location(module_name, module_path)
         module = importlib.util.module_from_spec(spec)
@@ -164,7 +472,7 @@ async def load_module_from_path(module_name, module_path):
         # Move the file to the error folder
         failed_pipelines_folder = os.path.join(PIPELINES_DIR, "failed")
         if not os.path.exists(failed_pipelines_folder):
-            os.makedirs(failed_pipelines_folder)
+            os.makedirs(failed_pipelines_folder, exist_ok=True)
 
         failed_file_path = os.path.join(failed_pipelines_folder, f"{module_name}.py")
         os.rename(module_path, failed_file_path)
@@ -172,91 +480,724 @@ async def load_module_from_path(module_name, module_path):
     return None
 
 
-async def load_modules_from_directory(directory):
-    global PIPELINE_MODULES
-    global PIPELINE_NAMES
+def load_pipeline(directory, module_name):
+    """
+    Imports a single pipeline module and applies its valves.json.
+
+    Runs on a LOAD_EXECUTOR thread; returns None if the module failed to load.
+    """
+    module_path = os.path.join(directory, f"{module_name}.py")
+
+    # Create subfolder matching the filename without the .py extension
+    subfolder_path = os.path.join(directory, module_name)
+    if not os.path.exists(subfolder_path):
+        os.makedirs(subfolder_path, exist_ok=True)
+        logging.info(f"Created subfolder: {subfolder_path}")
+
+    # Create a valves.json file if it doesn't exist
+    valves_json_path = os.path.join(subfolder_path, "valves.json")
+    if not os.path.exists(valves_json_path):
+        with open(valves_json_path, "w") as f:
+            json.dump({}, f)
+        logging.info(f"Created valves.json in: {subfolder_path}")
+
+    pipeline = load_module_from_path(module_name, module_path)
+    if pipeline:
+        # Overwrite pipeline.valves with values from valves.json
+        if os.path.exists(valves_json_path):
+            with open(valves_json_path, "r") as f:
+                valves_json = json.load(f)
+                if hasattr(pipeline, "valves"):
+                    ValvesModel = pipeline.valves.__class__
+                    # Create a ValvesModel instance using default values and overwrite with valves_json
+                    combined_valves = {
+                        **pipeline.valves.model_dump(),
+                        **valves_json,
+                    }
+                    valves = ValvesModel(**combined_valves)
+                    pipeline.valves = valves
+
+                    logging.info(f"Updated valves for module: {module_name}")
+
+    return pipeline
+
 
+def scan_pipelines_dir(directory):
+    """
+    Returns {module_name: (content hash, valves.json mtime)} for every
+    pipeline file in `directory`, used to tell which modules changed.
+    """
+    sources = {}
     for filename in os.listdir(directory):
         if filename.endswith(".py"):
             module_name = filename[:-3]  # Remove the .py extension
-            module_path = os.path.join(directory, filename)
-
-            # Create subfolder matching the filename without the .py extension
-            subfolder_path = os.path.join(directory, module_name)
-            if not os.path.exists(subfolder_path):
-                os.makedirs(subfolder_path)
-                logging.info(f"Created subfolder: {subfolder_path}")
-
-            # Create a valves.json file if it doesn't exist
-            valves_json_path = os.path.join(subfolder_path, "valves.json")
-            if not os.path.exists(valves_json_path):
-                with open(valves_json_path, "w") as f:
-                    json.dump({}, f)
-                logging.info(f"Created valves.json in: {subfolder_path}")
-
-            pipeline = await load_module_from_path(module_name, module_path)
-            if pipeline:
-                # Overwrite pipeline.valves with values from valves.json
-                if os.path.exists(valves_json_path):
-                    with open(valves_json_path, "r") as f:
-                        valves_json = json.load(f)
-                        if hasattr(pipeline, "valves"):
-                            ValvesModel = pipeline.valves.__class__
-                            # Create a ValvesModel instance using default values and overwrite with valves_json
-                            combined_valves = {
-                                **pipeline.valves.model_dump(),
-                                **valves_json,
-                            }
-                            valves = ValvesModel(**combined_valves)
-                            pipeline.valves = valves
-
-                            logging.info(f"Updated valves for module: {module_name}")
-
-                pipeline_id = pipeline.id if hasattr(pipeline, "id") else module_name
-                PIPELINE_MODULES[pipeline_id] = pipeline
-                PIPELINE_NAMES[pipeline_id] = module_name
-                logging.info(f"Loaded module: {module_name}")
+            with open(os.path.join(directory, filename), "rb") as f:
+                content_hash = hashlib.sha256(f.read()).hexdigest()
+
+            valves_json_path = os.path.join(directory, module_name, "valves.json")
+            valves_mtime = (
+                os.path.getmtime(valves_json_path)
+                if os.path.exists(valves_json_path)
+                else None
+            )
+            sources[module_name] = (content_hash, valves_mtime)
+    return sources
+
+
+def get_valves_mtime(module_name):
+    valves_json_path = os.path.join(PIPELINES_DIR, module_name, "valves.json")
+    if os.path.exists(valves_json_path):
+        return os.path.getmtime(valves_json_path)
+    return None
+
+
+async def import_modules(directory, module_names, job=None):
+    """
+    Imports the given modules concurrently without registering them.
+
+    Returns (module_name, pipeline_id, pipeline, load_time, content_hash) for
+    every module that loaded, in the order of `module_names`. Progress and
+    load times are reported to the reload `job`, if any.
+    """
+    loop = asyncio.get_running_loop()
+
+    async def load(module_name):
+        start_time = time.perf_counter()
+        try:
+            pipeline = await loop.run_in_executor(
+                LOAD_EXECUTOR, load_pipeline, directory, module_name
+            )
+        except Exception as e:
+            logging.error(f"Error loading module {module_name}: {e}")
+            pipeline = None
+        return pipeline, time.perf_counter() - start_time
+
+    sources = scan_pipelines_dir(directory)
+
+    # Install the frontmatter requirements of all modules in one batch
+    requirement_sets = []
+    for module_name in module_names:
+        module_path = os.path.join(directory, f"{module_name}.py")
+        try:
+            frontmatter = read_frontmatter(module_path)
+        except Exception as e:
+            logging.error(f"Error reading frontmatter of {module_name}: {e}")
+            continue
+        requirement_sets.append(parse_requirements(frontmatter.get("requirements")))
+    if job is not None:
+        job.set_stage("installing requirements")
+    try:
+        await loop.run_in_executor(
+            LOAD_EXECUTOR, install_requirements_locked, requirement_sets
+        )
+    except Exception as e:
+        # Modules with missing requirements fail to import below
+        logging.error(f"Error installing requirements: {e}")
+
+    if job is not None:
+        job.set_stage(f"importing {len(module_names)} modules")
+    results = await asyncio.gather(*[load(name) for name in module_names])
+
+    imported = []
+    for module_name, (pipeline, load_time) in zip(module_names, results):
+        if pipeline:
+            pipeline_id = pipeline.id if hasattr(pipeline, "id") else module_name
+            imported.append(
+                (module_name, pipeline_id, pipeline, load_time, sources[module_name][0])
+            )
+            logging.info(f"Loaded module: {module_name} in {load_time:.2f}s")
+            if job is not None:
+                job.record(module_name, load=load_time)
+        else:
+            logging.warning(f"No Pipeline class found in {module_name}")
+            if job is not None:
+                job.record(module_name, load=load_time, error="Failed to load")
+    return imported
+
+
+def register_module(module_name, pipeline_id, pipeline, load_time, content_hash):
+    PIPELINE_MODULES[pipeline_id] = pipeline
+    PIPELINE_NAMES[pipeline_id] = module_name
+    PIPELINE_TIMINGS[pipeline_id] = {"load": load_time}
+    # valves.json may have been created by load_pipeline
+    MODULE_SOURCES[module_name] = (content_hash, get_valves_mtime(module_name))
+
+
+async def load_modules_from_directory(directory, module_names=None):
+    """
+    Imports the given modules (all of `directory` by default) concurrently and
+    registers them. Returns the ids of the registered pipelines.
+    """
+    if module_names is None:
+        module_names = list(scan_pipelines_dir(directory).keys())
+
+    # Register in directory order regardless of which import finished first
+    pipeline_ids = []
+    for entry in await import_modules(directory, module_names):
+        register_module(*entry)
+        pipeline_ids.append(entry[1])
+
+    rebuild_registry()
+    return pipeline_ids
+
+
+def run_startup(pipeline_id, module):
+    """
+    Runs on_startup on a fresh event loop in a LOAD_EXECUTOR thread. Tasks it
+    leaves behind are cancelled with the loop, so they are reported.
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(module.on_startup())
+        pending = asyncio.all_tasks(loop)
+        if pending:
+            logging.warning(
+                f"on_startup of {pipeline_id} left {len(pending)} tasks running, "
+                f"which are cancelled; set `blocking = False` on it to start it "
+                f"on the server's event loop"
+            )
+            for task in pending:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        loop.run_until_complete(loop.shutdown_asyncgens())
+    finally:
+        loop.close()
+
+
+async def start_module(pipeline_id, module=None):
+    """
+    Runs on_startup of one module to completion. `module` is the registered
+    instance by default, or one staged by reload().
+
+    on_startup runs on LOAD_EXECUTOR, so that modules loading large models
+    start in parallel and never stall the requests being served, whether at
+    startup, when warmed lazily or on reload. Pipelines whose on_startup
+    creates tasks or clients bound to the server's event loop set
+    `blocking = False` to start on that loop instead.
+    Returns the startup time.
+    """
+    if module is None:
+        module = PIPELINE_MODULES[pipeline_id]
+    start_time = time.perf_counter()
+    try:
+        if hasattr(module, "on_startup"):
+            if getattr(module, "blocking", None) is False:
+                await module.on_startup()
             else:
-                logging.warning(f"No Pipeline class found in {module_name}")
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(
+                    LOAD_EXECUTOR, run_startup, pipeline_id, module
+                )
+    finally:
+        startup_time = time.perf_counter() - start_time
+        if PIPELINE_MODULES.get(pipeline_id) is module:
+            PIPELINE_TIMINGS.setdefault(pipeline_id, {})["startup"] = startup_time
+    logging.info(f"Started module: {pipeline_id} in {startup_time:.2f}s")
+    return startup_time
+
+
+async def start_modules(pipeline_ids):
+    """
+    Starts the given modules concurrently. A module whose on_startup fails is
+    unregistered without affecting the others.
+    """
+
+    async def start(pipeline_id):
+        try:
+            await start_module(pipeline_id)
+        except Exception as e:
+            return e
+
+    pipeline_ids = list(pipeline_ids)
+    results = await asyncio.gather(
+        *[start(pipeline_id) for pipeline_id in pipeline_ids]
+    )
+
+    failed = False
+    for pipeline_id, error in zip(pipeline_ids, results):
+        if error is None:
+            READINESS.mark(pipeline_id, READY)
+        else:
+            logging.error(f"Error starting module {pipeline_id}: {error}")
+            PIPELINE_MODULES.pop(pipeline_id, None)
+            PIPELINE_NAMES.pop(pipeline_id, None)
+            PIPELINE_TIMINGS.pop(pipeline_id, None)
+            READINESS.forget(pipeline_id)
+            failed = True
+
+    if failed:
+        rebuild_registry()
 
-    global PIPELINES
-    PIPELINES = get_all_pipelines()
+
+def is_lazy(pipeline_id):
+    return "*" in LAZY_PIPELINES or pipeline_id in LAZY_PIPELINES
+
+
+async def activate_modules(pipeline_ids):
+    """
+    Starts freshly loaded modules: eager ones now, lazy ones stay cold until
+    warmed in the background or on first use.
+    """
+    lazy_ids = [pipeline_id for pipeline_id in pipeline_ids if is_lazy(pipeline_id)]
+    for pipeline_id in lazy_ids:
+        READINESS.mark(pipeline_id, COLD)
+
+    await start_modules(
+        [pipeline_id for pipeline_id in pipeline_ids if not is_lazy(pipeline_id)]
+    )
+
+    if LAZY_WARMUP == "background":
+        for pipeline_id in lazy_ids:
+            READINESS.warm(pipeline_id)
 
 
 async def on_startup():
-    await load_modules_from_directory(PIPELINES_DIR)
+    start_time = time.perf_counter()
 
-    for module in PIPELINE_MODULES.values():
-        if hasattr(module, "on_startup"):
-            await module.on_startup()
+    pipeline_ids = await load_modules_from_directory(PIPELINES_DIR)
+    await activate_modules(pipeline_ids)
+    await CATALOG.refresh_all(PIPELINE_MODULES)
 
+    startup_time = time.perf_counter() - start_time
+    logging.info(f"Started {len(PIPELINE_MODULES)} pipelines in {startup_time:.2f}s")
 
-async def on_shutdown():
-    for module in PIPELINE_MODULES.values():
-        if hasattr(module, "on_shutdown"):
+
+async def preload():
+    """
+    Loads and starts every pipeline before the server starts, so that
+    pre-forked workers inherit the loaded models instead of each loading
+    their own copy. Lazy pipelines are warmed here too, unless they are
+    warmed on demand, in which case every worker warms its own.
+
+    Models hosted in inference worker processes cannot be inherited: their
+    workers are stopped before forking, and every forked worker starts its
+    own in lifespan() before serving.
+    """
+    global PRELOADED
+    await on_startup()
+
+    warming = [
+        readiness.task
+        for readiness in READINESS.pipelines.values()
+        if readiness.task is not None
+    ]
+    await asyncio.gather(*warming)
+    await suspend_pools()
+
+    # The pool's threads do not survive the fork, see reset_after_fork()
+    LOAD_EXECUTOR.shutdown(wait=True)
+    PRELOADED = True
+
+
+def reset_after_fork():
+    """
+    Replaces the thread pools and locks inherited by a forked worker, whose
+    threads only exist in the parent.
+    """
+    global LOAD_EXECUTOR, REQUIREMENTS_LOCK, HOOK_EXECUTOR
+    LOAD_EXECUTOR = ThreadPoolExecutor(
+        max_workers=PIPELINES_LOAD_CONCURRENCY, thread_name_prefix="pipelines-load"
+    )
+    REQUIREMENTS_LOCK = threading.Lock()
+    HOOK_EXECUTOR = HookExecutor(max_workers=HOOK_WORKERS)
+
+
+os.register_at_fork(after_in_child=reset_after_fork)
+
+
+async def shutdown_module(pipeline_id):
+    module = PIPELINE_MODULES[pipeline_id]
+    # Cold lazy pipelines never ran on_startup
+    if hasattr(module, "on_shutdown") and READINESS.is_ready(pipeline_id):
+        await module.on_shutdown()
+
+
+async def retire_module(pipeline_id, module, started):
+    """
+    Shuts down an instance that a reload removed from the registry, once the
+    requests still using it have finished.
+    """
+    if not await INFLIGHT.drain(module, DRAIN_TIMEOUT):
+        logging.warning(
+            f"Shutting down {pipeline_id} with {INFLIGHT.count(module)} "
+            f"requests still running after {DRAIN_TIMEOUT:.0f}s"
+        )
+    if started and hasattr(module, "on_shutdown"):
+        try:
             await module.on_shutdown()
+        except Exception as e:
+            logging.error(f"Error shutting down module {pipeline_id}: {e}")
+    logging.info(f"Retired module: {pipeline_id}")
 
 
-async def reload():
-    await on_shutdown()
-    # Clear existing pipelines
-    PIPELINES.clear()
-    PIPELINE_MODULES.clear()
-    PIPELINE_NAMES.clear()
-    # Load pipelines afresh
-    await on_startup()
+async def on_shutdown():
+    await asyncio.gather(*RETIRING)
+    for pipeline_id in list(PIPELINE_MODULES.keys()):
+        await shutdown_module(pipeline_id)
+
+
+async def ensure_ready(pipeline_id):
+    """
+    Waits for a lazy pipeline to finish warming, or raises a 503.
+    """
+    if READINESS.is_ready(pipeline_id):
+        return
+
+    try:
+        with timed(f"warmup.{pipeline_id}"):
+            await READINESS.wait_ready(pipeline_id, timeout=READY_TIMEOUT)
+    except PipelineNotReady as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "5"},
+        )
+
+
+def get_bulkhead(pipeline_id):
+    """
+    Returns the bulkhead of a module, creating or resizing it as needed.
+
+    Limits come from the module's `max_concurrency` / `max_queue` valves if
+    it has them, then from PIPELINES_CONCURRENCY_LIMITS, then from the
+    PIPELINES_MAX_CONCURRENCY / PIPELINES_MAX_QUEUE defaults.
+    """
+    max_concurrency, max_queue = BULKHEAD_LIMITS.get(pipeline_id, (None, None))
+    if max_concurrency is None:
+        max_concurrency = MAX_CONCURRENCY
+    if max_queue is None:
+        max_queue = MAX_QUEUE
+
+    valves = getattr(PIPELINE_MODULES.get(pipeline_id), "valves", None)
+    max_concurrency = getattr(valves, "max_concurrency", max_concurrency)
+    max_queue = getattr(valves, "max_queue", max_queue)
+
+    bulkhead = BULKHEADS.get(pipeline_id)
+    if bulkhead is None:
+        bulkhead = Bulkhead(pipeline_id, max_concurrency, max_queue)
+        BULKHEADS[pipeline_id] = bulkhead
+    elif (bulkhead.max_concurrency, bulkhead.max_queue) != (max_concurrency, max_queue):
+        bulkhead.configure(max_concurrency, max_queue)
+    return bulkhead
+
+
+async def acquire_pipeline_slot(pipeline_id):
+    """
+    Takes a slot in a module's bulkhead, or raises a 429 if its queue is full.
+    """
+    bulkhead = get_bulkhead(pipeline_id)
+    try:
+        wait_time = await bulkhead.acquire()
+    except BulkheadFull as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": RETRY_AFTER},
+        )
+    if wait_time:
+        record(f"queue.{pipeline_id}", int(wait_time * 1e9))
+    return bulkhead
+
+
+def is_blocking(pipeline):
+    """
+    Whether a pipeline's async hooks run on the hook executor: as declared by
+    its `blocking` attribute, or else once it has been caught blocking the loop.
+    """
+    blocking = getattr(pipeline, "blocking", None)
+    if blocking is not None:
+        return bool(blocking)
+    return pipeline in BLOCKING_DETECTED
+
+
+async def call_hook(pipeline, hook, *args):
+    """
+    Calls a filter hook (inlet/outlet) of the instance `pipeline` on the event
+    loop, or on the hook executor for blocking pipelines and sync hooks.
+    """
+    fn = getattr(pipeline, hook)
+    if is_blocking(pipeline) or not inspect.iscoroutinefunction(fn):
+        return await HOOK_EXECUTOR.run(fn, *args)
+    return await fn(*args)
+
+
+@contextmanager
+def timed_hook(
+    pipeline_id, hook, stage=None, desc=None, body=None, verdict=False, cache=None
+):
+    """
+    Times a pipeline hook as a Server-Timing stage and in the hook latency
+    histogram, and traces it as a child span of the request.
+    """
+    with timed(stage or hook, desc), HOOK_DURATION.time((pipeline_id, hook)):
+        with trace_hook(pipeline_id, hook, body, verdict, cache):
+            yield
+
+
+def get_module(pipeline_id):
+    """
+    Returns the instance currently serving a module, or raises a 404 if a
+    reload removed it.
+    """
+    pipeline = PIPELINE_MODULES.get(pipeline_id)
+    if pipeline is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Pipeline {pipeline_id} not found",
+        )
+    return pipeline
+
+
+@asynccontextmanager
+async def pipeline_slot(pipeline_id, pipeline):
+    """
+    Holds a slot in a module's bulkhead, and keeps the instance `pipeline`
+    from being shut down by a reload until the request is done with it.
+    """
+    INFLIGHT.acquire(pipeline)
+    try:
+        bulkhead = await acquire_pipeline_slot(pipeline_id)
+        try:
+            yield
+        finally:
+            bulkhead.release()
+    finally:
+        INFLIGHT.release(pipeline)
+
+
+def unregister_module(pipeline_id):
+    module_name = PIPELINE_NAMES.pop(pipeline_id, None)
+    BULKHEADS.pop(pipeline_id, None)
+    PIPELINE_MODULES.pop(pipeline_id, None)
+    PIPELINE_TIMINGS.pop(pipeline_id, None)
+    MODULE_SOURCES.pop(module_name, None)
+    READINESS.forget(pipeline_id)
+    FILTER_ORDERING.forget(pipeline_id)
+    VERDICTS.invalidate(pipeline_id)
+
+
+def apply_valves_json(pipeline_id):
+    """
+    Re-reads a module's valves.json into its existing valves.
+    """
+    pipeline = PIPELINE_MODULES[pipeline_id]
+    if not hasattr(pipeline, "valves"):
+        return
+
+    valves_json_path = os.path.join(
+        PIPELINES_DIR, PIPELINE_NAMES[pipeline_id], "valves.json"
+    )
+    with open(valves_json_path, "r") as f:
+        valves_json = json.load(f)
+
+    ValvesModel = pipeline.valves.__class__
+    pipeline.valves = ValvesModel(**{**pipeline.valves.model_dump(), **valves_json})
+    VERDICTS.invalidate(pipeline_id)
+    logging.info(f"Updated valves for module: {PIPELINE_NAMES[pipeline_id]}")
+
+
+async def start_staged(staged, job=None):
+    """
+    Runs on_startup of instances staged by reload(). Returns those that
+    started with their startup times; the others are logged and dropped.
+    """
+
+    async def start(pipeline_id, pipeline):
+        try:
+            return await start_module(pipeline_id, pipeline)
+        except Exception as e:
+            return e
+
+    results = await asyncio.gather(
+        *[start(entry[1], entry[2]) for entry in staged]
+    )
+
+    started = []
+    for entry, result in zip(staged, results):
+        if isinstance(result, Exception):
+            logging.error(f"Error starting module {entry[1]}: {result}")
+            if job is not None:
+                job.record(entry[0], error=f"Failed to start: {result}")
+        else:
+            started.append((entry, result))
+            if job is not None:
+                job.record(entry[0], startup=result)
+    return started
+
+
+def retire(pipeline_id, pipeline, started):
+    task = asyncio.create_task(retire_module(pipeline_id, pipeline, started))
+    RETIRING.add(task)
+    task.add_done_callback(RETIRING.discard)
+
+
+async def reload(full=False, job=None):
+    """
+    Reloads the pipelines directory without interrupting requests.
+
+    Modules whose file was added or changed are imported and started while
+    the current instances keep serving, then swapped into the registry in a
+    single step. Instances that were replaced or whose file was removed are
+    shut down once their in-flight requests have finished. If a changed
+    module fails to load or start, its previous instance keeps serving.
+
+    Modules whose valves.json alone changed get their valves re-applied.
+    Untouched modules keep their instances and loaded models. `full`
+    reloads every module.
+
+    Progress and per-module timings are reported to the reload `job`, if
+    any. Returns the ids of the started, retired and valves-updated modules.
+    """
+    async with RELOAD_LOCK:
+        if job is not None:
+            job.set_stage("scanning")
+        start_time = time.perf_counter()
+        sources = scan_pipelines_dir(PIPELINES_DIR)
+        loaded = {
+            module_name: pipeline_id
+            for pipeline_id, module_name in PIPELINE_NAMES.items()
+        }
+
+        if full:
+            stale = list(loaded.keys())
+        else:
+            stale = [
+                module_name
+                for module_name in loaded
+                if module_name not in sources
+                or sources[module_name][0] != MODULE_SOURCES[module_name][0]
+            ]
+
+        valves_changed = [
+            loaded[module_name]
+            for module_name in loaded
+            if module_name not in stale
+            and sources[module_name][1] != MODULE_SOURCES[module_name][1]
+        ]
+        for pipeline_id in valves_changed:
+            try:
+                apply_valves_json(pipeline_id)
+                module_name = PIPELINE_NAMES[pipeline_id]
+                MODULE_SOURCES[module_name] = (
+                    sources[module_name][0],
+                    get_valves_mtime(module_name),
+                )
+                if hasattr(PIPELINE_MODULES[pipeline_id], "on_valves_updated"):
+                    await PIPELINE_MODULES[pipeline_id].on_valves_updated()
+            except Exception as e:
+                logging.error(f"Error updating valves of module {pipeline_id}: {e}")
+        if valves_changed:
+            rebuild_registry()
+
+        # Build the new instances while the current ones keep serving. Those
+        # replacing a warm instance, and eager ones, are started before the
+        # swap; lazy ones are swapped in cold.
+        pending = [
+            module_name
+            for module_name in sources
+            if module_name not in loaded or module_name in stale
+        ]
+        staged = await import_modules(PIPELINES_DIR, pending, job) if pending else []
+
+        eager, cold = [], []
+        for entry in staged:
+            previous_id = loaded.get(entry[0])
+            if not is_lazy(entry[1]) or (
+                previous_id is not None and READINESS.is_ready(previous_id)
+            ):
+                eager.append(entry)
+            else:
+                cold.append(entry)
+        if job is not None and eager:
+            job.set_stage(f"starting {len(eager)} modules")
+        started = await start_staged(eager, job)
+
+        swapped = [entry for entry, _ in started] + cold
+        await asyncio.gather(
+            *[
+                CATALOG.refresh(entry[1], entry[2])
+                for entry in swapped
+                if ManifoldCatalog.is_dynamic(entry[2])
+            ]
+        )
+
+        if job is not None:
+            job.set_stage("swapping")
+
+        # Swap: nothing below awaits until the registry is rebuilt, so every
+        # request sees either the old or the new set of instances
+        replaced = {entry[0] for entry in swapped}
+        retired = []
+        for module_name in stale:
+            if module_name in sources and module_name not in replaced:
+                # The new version failed to load or start
+                continue
+            pipeline_id = loaded.pop(module_name)
+            retired.append(
+                (
+                    pipeline_id,
+                    PIPELINE_MODULES[pipeline_id],
+                    READINESS.is_ready(pipeline_id),
+                )
+            )
+            bulkhead = BULKHEADS.get(pipeline_id)
+            unregister_module(pipeline_id)
+            if bulkhead is not None and any(
+                entry[1] == pipeline_id for entry in swapped
+            ):
+                # The old and new instance share the concurrency limits
+                BULKHEADS[pipeline_id] = bulkhead
+
+        for entry, startup_time in started:
+            register_module(*entry)
+            PIPELINE_TIMINGS[entry[1]]["startup"] = startup_time
+            READINESS.mark(entry[1], READY)
+        for entry in cold:
+            register_module(*entry)
+            READINESS.mark(entry[1], COLD)
+
+        CATALOG.prune(PIPELINE_MODULES.keys())
+        if swapped or retired:
+            rebuild_registry()
+
+        for pipeline_id, pipeline, was_started in retired:
+            retire(pipeline_id, pipeline, was_started)
+        if LAZY_WARMUP == "background":
+            for entry in cold:
+                READINESS.warm(entry[1])
+
+        reload_time = time.perf_counter() - start_time
+        logging.info(
+            f"Reloaded pipelines in {reload_time:.2f}s: "
+            f"{len(swapped)} started, {len(retired)} retired, "
+            f"{len(valves_changed)} valves updated"
+        )
+        return {
+            "started": [entry[1] for entry in swapped],
+            "retired": [pipeline_id for pipeline_id, _, _ in retired],
+            "valves_updated": valves_changed,
+        }
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await on_startup()
+    if not PRELOADED:
+        await on_startup()
+    else:
+        await resume_pools()
+    CATALOG.start(lambda: PIPELINE_MODULES)
+    LOOP_MONITOR.start()
     yield
+    await RELOADS.stop()
+    await LOOP_MONITOR.stop()
+    await CATALOG.stop()
     await on_shutdown()
 
 
 app = FastAPI(docs_url="/docs", redoc_url=None, lifespan=lifespan)
 
 app.state.PIPELINES = PIPELINES
+app.state.REGISTRY = REGISTRY
 
 
 origins = ["*"]
@@ -271,54 +1212,24 @@ app.add_middleware(
 )
 
 
-@app.middleware("http")
-async def check_url(request: Request, call_next):
-    start_time = int(time.time())
-    app.state.PIPELINES = get_all_pipelines()
-    response = await call_next(request)
-    process_time = int(time.time()) - start_time
-    response.headers["X-Process-Time"] = str(process_time)
-
-    return response
-
+app.add_middleware(ServerTimingMiddleware)
 
-@app.get("/v1/models")
-@app.get("/models")
-async def get_models(user: str = Depends(get_current_user)):
-    """
-    Returns the available pipelines
-    """
-    app.state.PIPELINES = get_all_pipelines()
-    return {
-        "data": [
-            {
-                "id": pipeline["id"],
-                "name": pipeline["name"],
-                "object": "model",
-                "created": int(time.time()),
-                "owned_by": "openai",
-                "pipeline": {
-                    "type": pipeline["type"],
-                    **(
-                        {
-                            "pipelines": (
-                                pipeline["valves"].pipelines
-                                if pipeline.get("valves", None)
-                                else []
-                            ),
-                            "priority": pipeline.get("priority", 0),
-                        }
-                        if pipeline.get("type", "pipe") == "filter"
-                        else {}
-                    ),
-                    "valves": pipeline["valves"] != None,
-                },
-            }
-            for pipeline in app.state.PIPELINES.values()
-        ],
-        "object": "list",
-        "pipelines": True,
-    }
+
+@app.get("/v1/models")
+@app.get("/models")
+async def get_models(request: Request, user: str = Depends(get_current_user)):
+    """
+    Returns the available pipelines
+    """
+    registry = app.state.REGISTRY
+    if etag_matches(request.headers.get("if-none-match"), registry.etag):
+        return Response(status_code=304, headers={"ETag": registry.etag})
+
+    return Response(
+        content=registry.models_body,
+        media_type="application/json",
+        headers={"ETag": registry.etag},
+    )
 
 
 @app.get("/v1")
@@ -327,6 +1238,45 @@ async def get_status():
     return {"status": True}
 
 
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Returns pipeline metrics in the Prometheus text format
+    """
+    return Response(
+        content=METRICS.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+@app.get("/v1/ready")
+@app.get("/ready")
+async def get_ready(pipelines: Optional[str] = None):
+    """
+    Reports the warm state of each pipeline.
+
+    Returns 503 until every eagerly started pipeline, or every pipeline in the
+    comma-separated `pipelines` query parameter, is ready.
+    """
+    if pipelines:
+        required = [pipeline_id.strip() for pipeline_id in pipelines.split(",")]
+    else:
+        required = [
+            pipeline_id for pipeline_id in PIPELINE_MODULES if not is_lazy(pipeline_id)
+        ]
+
+    ready = all(
+        pipeline_id in PIPELINE_MODULES and READINESS.is_ready(pipeline_id)
+        for pipeline_id in required
+    )
+    return JSONResponse(
+        status_code=(
+            status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE
+        ),
+        content={"status": ready, "pipelines": READINESS.status()},
+    )
+
+
 @app.get("/v1/pipelines")
 @app.get("/pipelines")
 async def list_pipelines(user: str = Depends(get_current_user)):
@@ -357,6 +1307,63 @@ async def list_pipelines(user: str = Depends(get_current_user)):
         )
 
 
+@app.get("/v1/pipelines/catalogs")
+@app.get("/pipelines/catalogs")
+async def list_catalogs(user: str = Depends(get_current_user)):
+    """
+    Returns the state and age (in seconds) of each manifold model catalog
+    """
+    if user == API_KEY:
+        return {"data": CATALOG.status()}
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid API key",
+        )
+
+
+@app.get("/v1/pipelines/bulkheads")
+@app.get("/pipelines/bulkheads")
+async def list_bulkheads(user: str = Depends(get_current_user)):
+    """
+    Returns the concurrency limits, occupancy and queue-wait totals of each
+    pipeline
+    """
+    if user == API_KEY:
+        return {
+            "data": [
+                {"id": pipeline_id, **bulkhead.status()}
+                for pipeline_id, bulkhead in BULKHEADS.items()
+            ]
+        }
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid API key",
+        )
+
+
+@app.get("/v1/pipelines/streams")
+@app.get("/pipelines/streams")
+async def list_streams(user: str = Depends(get_current_user)):
+    """
+    Returns the completed and aborted streams of each pipeline, and the
+    estimated upstream tokens saved by closing aborted ones
+    """
+    if user == API_KEY:
+        return {
+            "data": [
+                {"id": pipeline_id, **stats}
+                for pipeline_id, stats in STREAMS.status().items()
+            ]
+        }
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid API key",
+        )
+
+
 class AddPipelineForm(BaseModel):
     url: str
 
@@ -400,10 +1407,12 @@ async def add_pipeline(
 
         print(url)
         file_path = await download_file(url, dest_folder=PIPELINES_DIR)
-        await reload()
+        job = RELOADS.submit(f"add {os.path.basename(file_path)}")
         return {
             "status": True,
-            "detail": f"Pipeline added successfully from {file_path}",
+            "detail": f"Pipeline downloaded to {file_path}, loading queued; "
+            f"see /pipelines/jobs/{job.id}",
+            "job": job.id,
         }
     except HTTPException as e:
         raise e
@@ -443,12 +1452,14 @@ async def upload_pipeline(
         with open(file_path, "wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
 
-        # Perform any necessary reload or processing
-        await reload()
+        # The module is loaded by a background reload job
+        job = RELOADS.submit(f"upload {file.filename}")
 
         return {
             "status": True,
-            "detail": f"Pipeline uploaded successfully to {file_path}",
+            "detail": f"Pipeline saved to {file_path}, loading queued; "
+            f"see /pipelines/jobs/{job.id}",
+            "job": job.id,
         }
     except HTTPException as e:
         raise e
@@ -477,17 +1488,16 @@ async def delete_pipeline(
     pipeline_id = form_data.id
     pipeline_name = PIPELINE_NAMES.get(pipeline_id.split(".")[0], None)
 
-    if PIPELINE_MODULES[pipeline_id]:
-        if hasattr(PIPELINE_MODULES[pipeline_id], "on_shutdown"):
-            await PIPELINE_MODULES[pipeline_id].on_shutdown()
-
+    # The reload job shuts the module down once its file is gone
     pipeline_path = os.path.join(PIPELINES_DIR, f"{pipeline_name}.py")
     if os.path.exists(pipeline_path):
         os.remove(pipeline_path)
-        await reload()
+        job = RELOADS.submit(f"delete {pipeline_name}.py")
         return {
             "status": True,
-            "detail": f"Pipeline {pipeline_id} deleted successfully",
+            "detail": f"Pipeline file of {pipeline_id} removed, unloading queued; "
+            f"see /pipelines/jobs/{job.id}",
+            "job": job.id,
         }
     else:
         raise HTTPException(
@@ -498,10 +1508,63 @@ async def delete_pipeline(
 
 @app.post("/v1/pipelines/reload")
 @app.post("/pipelines/reload")
-async def reload_pipelines(user: str = Depends(get_current_user)):
+async def reload_pipelines(
+    full: bool = False, wait: bool = True, user: str = Depends(get_current_user)
+):
+    """
+    Reloads the pipelines and returns once they are reloaded, or right away
+    with the id of the queued reload job if `wait` is false.
+    """
+    if user == API_KEY:
+        job = RELOADS.submit("reload", full=full)
+        if not wait:
+            return {"message": "Pipelines reload queued.", "job": job.id}
+
+        await job.done.wait()
+        if job.error is not None:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=job.error,
+            )
+        return {"message": "Pipelines reloaded successfully.", "job": job.id}
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid API key",
+        )
+
+
+@app.get("/v1/pipelines/jobs")
+@app.get("/pipelines/jobs")
+async def get_reload_jobs(user: str = Depends(get_current_user)):
+    """
+    Returns the recent reload jobs, newest first
+    """
+    if user == API_KEY:
+        return {
+            "data": [job.status() for job in reversed(list(RELOADS.jobs.values()))]
+        }
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid API key",
+        )
+
+
+@app.get("/v1/pipelines/jobs/{job_id}")
+@app.get("/pipelines/jobs/{job_id}")
+async def get_reload_job(job_id: str, user: str = Depends(get_current_user)):
+    """
+    Returns the state, current stage and per-module timings of a reload job
+    """
     if user == API_KEY:
-        await reload()
-        return {"message": "Pipelines reloaded successfully."}
+        job = RELOADS.get(job_id)
+        if job is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Reload job {job_id} not found",
+            )
+        return job.status()
     else:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -571,6 +1634,7 @@ async def update_valves(pipeline_id: str, form_data: dict):
         ValvesModel = pipeline.valves.__class__
         valves = ValvesModel(**form_data)
         pipeline.valves = valves
+        VERDICTS.invalidate(pipeline_id)
 
         # Determine the directory path for the valves.json file
         subfolder_path = os.path.join(PIPELINES_DIR, PIPELINE_NAMES[pipeline_id])
@@ -580,8 +1644,21 @@ async def update_valves(pipeline_id: str, form_data: dict):
         with open(valves_json_path, "w") as f:
             json.dump(valves.model_dump(), f)
 
+        # Already applied, so reload() must not treat the file as changed
+        module_name = PIPELINE_NAMES[pipeline_id]
+        MODULE_SOURCES[module_name] = (
+            MODULE_SOURCES[module_name][0],
+            get_valves_mtime(module_name),
+        )
+
         if hasattr(pipeline, "on_valves_updated"):
             await pipeline.on_valves_updated()
+
+        rebuild_registry()
+
+        # New valves usually mean a different model list (e.g. a new API key)
+        if CATALOG.is_dynamic(pipeline):
+            CATALOG.refresh_soon(PIPELINE_MODULES)
     except Exception as e:
         print(e)
         raise HTTPException(
@@ -595,6 +1672,8 @@ async def update_valves(pipeline_id: str, form_data: dict):
 @app.post("/v1/{pipeline_id}/filter/inlet")
 @app.post("/{pipeline_id}/filter/inlet")
 async def filter_inlet(pipeline_id: str, form_data: FilterForm):
+    mark("validation")
+
     if pipeline_id not in app.state.PIPELINES:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -608,25 +1687,38 @@ async def filter_inlet(pipeline_id: str, form_data: FilterForm):
     except:
         pass
 
-    pipeline = PIPELINE_MODULES[pipeline_id]
+    await ensure_ready(pipeline_id)
+    pipeline = get_module(pipeline_id)
 
-    try:
-        if hasattr(pipeline, "inlet"):
-            body = await pipeline.inlet(form_data.body, form_data.user)
-            return body
-        else:
-            return form_data.body
-    except Exception as e:
-        print(e)
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"{str(e)}",
-        )
+    async with pipeline_slot(pipeline_id, pipeline):
+        try:
+            if hasattr(pipeline, "inlet"):
+                with timed_hook(
+                    pipeline_id,
+                    "inlet",
+                    desc=pipeline_id,
+                    body=form_data.body,
+                    verdict=True,
+                ):
+                    body = await call_hook(
+                        pipeline, "inlet", form_data.body, form_data.user
+                    )
+                return body
+            else:
+                return form_data.body
+        except Exception as e:
+            print(e)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"{str(e)}",
+            )
 
 
 @app.post("/v1/{pipeline_id}/filter/outlet")
 @app.post("/{pipeline_id}/filter/outlet")
 async def filter_outlet(pipeline_id: str, form_data: FilterForm):
+    mark("validation")
+
     if pipeline_id not in app.state.PIPELINES:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -640,38 +1732,54 @@ async def filter_outlet(pipeline_id: str, form_data: FilterForm):
     except:
         pass
 
-    pipeline = PIPELINE_MODULES[pipeline_id]
-
-    try:
-        if hasattr(pipeline, "outlet"):
-            body = await pipeline.outlet(form_data.body, form_data.user)
-            return body
-        else:
-            return form_data.body
-    except Exception as e:
-        print(e)
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"{str(e)}",
-        )
+    await ensure_ready(pipeline_id)
+    pipeline = get_module(pipeline_id)
+
+    async with pipeline_slot(pipeline_id, pipeline):
+        try:
+            if hasattr(pipeline, "outlet"):
+                with timed_hook(
+                    pipeline_id,
+                    "outlet",
+                    desc=pipeline_id,
+                    body=form_data.body,
+                    verdict=True,
+                ):
+                    body = await call_hook(
+                        pipeline, "outlet", form_data.body, form_data.user
+                    )
+                return body
+            else:
+                return form_data.body
+        except Exception as e:
+            print(e)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"{str(e)}",
+            )
 
 
 @app.post("/v1/chat/completions")
 @app.post("/chat/completions")
 async def generate_openai_chat_completion(form_data: OpenAIChatCompletionForm):
+    # Routing, body parsing and validation happen before the endpoint runs
+    mark("validation")
+
     messages = [message.model_dump() for message in form_data.messages]
     user_message = get_last_user_message(messages)
 
-    if (
-        form_data.model not in app.state.PIPELINES
-        or app.state.PIPELINES[form_data.model]["type"] == "filter"
-    ):
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Pipeline {form_data.model} not found",
-        )
+    with timed("registry"):
+        if (
+            form_data.model not in app.state.PIPELINES
+            or app.state.PIPELINES[form_data.model]["type"] == "filter"
+        ):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Pipeline {form_data.model} not found",
+            )
+
+        module_id = app.state.PIPELINES[form_data.model]["module"]
 
-    def job():
         print(form_data.model)
 
         pipeline = app.state.PIPELINES[form_data.model]
@@ -680,169 +1788,668 @@ async def generate_openai_chat_completion(form_data: OpenAIChatCompletionForm):
         print(pipeline_id)
 
         if pipeline["type"] == "manifold":
-            manifold_id, pipeline_id = pipeline_id.split(".", 1)
-            pipe = PIPELINE_MODULES[manifold_id].pipe
-        else:
-            pipe = PIPELINE_MODULES[pipeline_id].pipe
-
-        if form_data.stream:
-
-            def stream_content():
-                res = pipe(
-                    user_message=user_message,
-                    model_id=pipeline_id,
-                    messages=messages,
-                    body=form_data.model_dump(),
-                )
+            pipeline_id = pipeline_id.split(".", 1)[1]
+
+    await ensure_ready(module_id)
+    # The instance serving this request, a reload keeps it running until the
+    # request is done with it
+    module = get_module(module_id)
+    pipe = module.pipe
+
+    async def call_pipe():
+        kwargs = {
+            "user_message": user_message,
+            "model_id": pipeline_id,
+            "messages": messages,
+            "body": form_data.model_dump(),
+        }
 
-                logging.info(f"stream:true:{res}")
-
-                if isinstance(res, str):
-                    message = stream_message_template(form_data.model, res)
-                    logging.info(f"stream_content:str:{message}")
-                    yield f"data: {json.dumps(message)}\n\n"
-
-                if isinstance(res, Iterator):
-                    for line in res:
-                        if isinstance(line, BaseModel):
-                            line = line.model_dump_json()
-                            line = f"data: {line}"
-
-                        try:
-                            line = line.decode("utf-8")
-                        except:
-                            pass
-
-                        logging.info(f"stream_content:Generator:{line}")
-
-                        if line.startswith("data:"):
-                            yield f"{line}\n\n"
-                        else:
-                            line = stream_message_template(form_data.model, line)
-                            yield f"data: {json.dumps(line)}\n\n"
-
-                if isinstance(res, str) or isinstance(res, Generator):
-                    finish_message = {
-                        "id": f"{form_data.model}-{str(uuid.uuid4())}",
-                        "object": "chat.completion.chunk",
-                        "created": int(time.time()),
-                        "model": form_data.model,
-                        "choices": [
-                            {
-                                "index": 0,
-                                "delta": {},
-                                "logprobs": None,
-                                "finish_reason": "stop",
-                            }
-                        ],
-                    }
+        # Async pipes run directly on the event loop, sync ones in the threadpool
+        if inspect.iscoroutinefunction(pipe) or inspect.isasyncgenfunction(pipe):
+            res = pipe(**kwargs)
+            if inspect.isawaitable(res):
+                res = await res
+            return res
+
+        return await run_in_threadpool(pipe, **kwargs)
+
+    if form_data.stream:
+        # The slot is held until the stream ends. release() runs from the
+        # generator's finally, or from the response's background task if the
+        # generator never started.
+        INFLIGHT.acquire(module)
+        try:
+            bulkhead = await acquire_pipeline_slot(module_id)
+        except BaseException:
+            INFLIGHT.release(module)
+            raise
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                bulkhead.release()
+                INFLIGHT.release(module)
+
+        # One completion id per stream; chunks are encoded straight to bytes
+        encoder = ChunkEncoder(form_data.model)
+
+        def encode_line(line):
+            if isinstance(line, BaseModel):
+                line = f"data: {line.model_dump_json()}"
+            elif isinstance(line, bytes):
+                line = line.decode("utf-8")
+
+            if line.startswith("data:"):
+                return encoder.event(line)
+            return encoder.delta(line)
+
+        # What the pipe returned, and how many chunks were pulled from it
+        result = None
+        pulled = 0
+
+        async def stream_content():
+            completed = aborted = False
+            # The headers are sent before the body is generated, so these
+            # stages only show up in the request's log line
+            start_ns = time.perf_counter_ns()
+            first_chunk = True
+            try:
+                async for chunk in generate_content():
+                    if first_chunk:
+                        first_chunk = False
+                        ttfc_ns = time.perf_counter_ns() - start_ns
+                        record("ttfc", ttfc_ns)
+                        STREAM_FIRST_CHUNK.observe(ttfc_ns / 1e9, (module_id,))
+                    yield chunk
+                completed = True
+            except (asyncio.CancelledError, GeneratorExit):
+                # Starlette cancels the response when the client disconnects
+                aborted = True
+                raise
+            finally:
+                stream_ns = time.perf_counter_ns() - start_ns
+                record("stream", stream_ns)
+                HOOK_DURATION.observe(stream_ns / 1e9, (module_id, "stream"))
+                STREAM_CHUNKS.inc((module_id,), pulled)
+                release()
+                if completed:
+                    STREAMS.record_completed(module_id, pulled)
+                elif result is not None:
+                    # Stop the pipe's upstream request instead of letting it
+                    # run to completion for nobody
+                    await close_upstream(result, STREAM_CLOSE_TIMEOUT)
+                if aborted:
+                    saved = STREAMS.record_aborted(
+                        module_id, pulled, getattr(form_data, "max_tokens", None)
+                    )
+                    logging.info(
+                        f"Client aborted stream of {pipeline_id} after {pulled} "
+                        f"chunks, ~{saved} tokens saved"
+                    )
+
+        async def count_pulled(lines):
+            nonlocal pulled
+            async for line in lines:
+                pulled += 1
+                yield line
+
+        async def generate_content():
+            nonlocal result
+            with timed_hook(module_id, "pipe", body=user_message):
+                res = result = await call_pipe()
+
+            logging.info(f"stream:true:{type(res).__name__}")
+
+            if isinstance(res, str):
+                yield encoder.delta(res)
+
+            lines = None
+            if isinstance(res, AsyncIterator):
+                lines = count_pulled(res)
+            elif isinstance(res, Iterator):
+                # Each chunk of a sync iterator is pulled in the threadpool
+                lines = count_pulled(iterate_in_threadpool(res))
+
+            if lines is not None and STREAM_COALESCE_BYTES > 0:
+                async for chunk in coalesce_deltas(
+                    lines,
+                    encode_line,
+                    encoder.delta,
+                    max_bytes=STREAM_COALESCE_BYTES,
+                    interval=STREAM_COALESCE_INTERVAL_MS / 1000,
+                ):
+                    yield chunk
+            elif lines is not None:
+                async for line in lines:
+                    yield encode_line(line)
+
+            if isinstance(res, (str, Generator, AsyncGenerator)):
+                yield encoder.finish()
+
+        return StreamingResponse(
+            stream_content(),
+            media_type="text/event-stream",
+            background=BackgroundTask(release),
+        )
+    else:
+        async with pipeline_slot(module_id, module):
+            with timed_hook(module_id, "pipe", body=user_message):
+                res = await call_pipe()
+        logging.info(f"stream:false:{res}")
+
+        if isinstance(res, dict):
+            return res
+        elif isinstance(res, BaseModel):
+            return res.model_dump()
+        else:
 
-                    yield f"data: {json.dumps(finish_message)}\n\n"
-                    yield f"data: [DONE]"
+            message = ""
 
-            return StreamingResponse(stream_content(), media_type="text/event-stream")
-        else:
-            res = pipe(
-                user_message=user_message,
-                model_id=pipeline_id,
-                messages=messages,
-                body=form_data.model_dump(),
-            )
-            logging.info(f"stream:false:{res}")
+            if isinstance(res, str):
+                message = res
 
-            if isinstance(res, dict):
-                return res
-            elif isinstance(res, BaseModel):
-                return res.model_dump()
-            else:
+            # Generating still runs on the instance
+            INFLIGHT.acquire(module)
+            try:
+                with timed_hook(module_id, "generate"):
+                    if isinstance(res, AsyncGenerator):
+                        async for stream in res:
+                            message = f"{message}{stream}"
 
-                message = ""
+                    if isinstance(res, Generator):
+                        message = await run_in_threadpool(
+                            lambda: "".join(f"{stream}" for stream in res)
+                        )
+            finally:
+                INFLIGHT.release(module)
 
-                if isinstance(res, str):
-                    message = res
+            logging.info(f"stream:false:{message}")
+            return {
+                "id": f"{form_data.model}-{str(uuid.uuid4())}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": form_data.model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {
+                            "role": "assistant",
+                            "content": message,
+                        },
+                        "logprobs": None,
+                        "finish_reason": "stop",
+                    }
+                ],
+            }
 
-                if isinstance(res, Generator):
-                    for stream in res:
-                        message = f"{message}{stream}"
+# Map of filter names to their pipeline IDs
+FILTER_PIPELINES = {
+    "NSFW": "nsfw_filter_pipeline",
+    "Ban List": "ban_list_pipeline",
+    "Restrict to Topic": "restrict_to_topic_pipeline",
+    "Regex Pattern Match": "regex_filter_pipeline",
+    "Jailbreak Detection": "jailbreak_filter_pipeline",
+    "Bias Check": "bias_check_pipeline",
+    "Document Classifier": "document_classifier_pipeline"
+}
 
-                logging.info(f"stream:false:{message}")
-                return {
-                    "id": f"{form_data.model}-{str(uuid.uuid4())}",
-                    "object": "chat.completion",
-                    "created": int(time.time()),
-                    "model": form_data.model,
-                    "choices": [
-                        {
-                            "index": 0,
-                            "message": {
-                                "role": "assistant",
-                                "content": message,
-                            },
-                            "logprobs": None,
-                            "finish_reason": "stop",
-                        }
-                    ],
-                }
+FILTER_MODES = ("sequential", "concurrent", "collect")
 
-    return await run_in_threadpool(job)
 
 class PerformFiltersRequest(BaseModel):
     enabled_filters: List[str]
     config: dict
     body: dict
+    # One of FILTER_MODES, defaults to PIPELINES_FILTERS_MODE
+    mode: Optional[str] = None
+
+
+async def run_filter(filter_name, pipeline_id, request):
+    """
+    Runs the inlet of one filter on a perform_filters request. Returns None
+    if the input passed, or the rejection message. Verdicts of cacheable
+    filters are served from and stored in the verdict cache. Inlets that
+    finish are sampled for the filter ordering.
+    """
+    await ensure_ready(pipeline_id)
+    pipeline = get_module(pipeline_id)
+    if not hasattr(pipeline, "inlet"):
+        return None
+
+    key = verdict_key(pipeline_id, pipeline, request) if VERDICTS.enabled else None
+    start_time = time.perf_counter()
+    if key is not None:
+        cached, message = VERDICTS.get(key)
+        if cached:
+            lookup_time = time.perf_counter() - start_time
+            record(
+                f"inlet.{pipeline_id}",
+                int(lookup_time * 1e9),
+                f"{filter_name} (cached)",
+            )
+            trace_cache_hit(pipeline_id, "inlet", request.body, message)
+            FILTER_ORDERING.observe(pipeline_id, lookup_time, message is not None)
+            if message is not None:
+                FILTER_REJECTIONS.inc((pipeline_id,))
+            return message
+
+    message = None
+    # Model workers failing is not a verdict on the input
+    cacheable = key is not None
+    async with pipeline_slot(pipeline_id, pipeline):
+        start_time = time.perf_counter()
+        try:
+            with timed_hook(
+                pipeline_id,
+                "inlet",
+                f"inlet.{pipeline_id}",
+                filter_name,
+                body=request.body,
+                verdict=True,
+                cache=None if key is None else "miss",
+            ):
+                await call_hook(pipeline, "inlet", request, None)
+        except Exception as e:
+            FILTER_REJECTIONS.inc((pipeline_id,))
+            message = str(e)
+            cacheable = cacheable and not isinstance(e, InferenceError)
+    FILTER_ORDERING.observe(
+        pipeline_id, time.perf_counter() - start_time, message is not None
+    )
+
+    if cacheable:
+        VERDICTS.put(key, message)
+    return message
+
+
+def filter_cost_hints(pipeline_ids):
+    return {
+        pipeline_id: getattr(PIPELINE_MODULES.get(pipeline_id), "cost_hint", None)
+        for pipeline_id in pipeline_ids
+    }
+
+
+async def run_filters_concurrently(filters, request):
+    """
+    Starts all filters at once. Returns (filter_name, message) of the first
+    filter to reject the input, after cancelling those still running, or
+    None if all of them passed.
+    """
+    tasks = [
+        asyncio.create_task(run_filter(filter_name, pipeline_id, request))
+        for filter_name, pipeline_id in filters
+    ]
+    try:
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            # Filters that finished together are reported in the listed order
+            for index, task in enumerate(tasks):
+                if task in done and task.result() is not None:
+                    return filters[index][0], task.result()
+        return None
+    finally:
+        # A blocking hook keeps running on its thread, but its slot and the
+        # response no longer wait for it
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def run_filters_to_end(filters, request):
+    """
+    Runs all filters at once and returns their rejection messages (None for
+    a pass) in the listed order. If one fails with an error that is not a
+    rejection, e.g. a 503 or 429, the others are cancelled and it is raised.
+    """
+    tasks = [
+        asyncio.create_task(run_filter(filter_name, pipeline_id, request))
+        for filter_name, pipeline_id in filters
+    ]
+    try:
+        return await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
 
 @app.post("/v1/perform_filters")
 @app.post("/perform_filters")
-async def perform_filters(request: PerformFiltersRequest, user: str = Depends(get_current_user)):
+async def perform_filters(
+    request: PerformFiltersRequest,
+    response: Response,
+    user: str = Depends(get_current_user),
+):
     """
     Performs enabled filters on the message body
+
+    In "sequential" mode the filters run one after another until one rejects
+    the input, cheapest per rejection first unless PIPELINES_FILTERS_ORDER is
+    "listed"; the order is returned in the X-Filter-Order header. In
+    "concurrent" mode they all start at once and the first rejection cancels
+    the others. In "collect" mode they all run to the end and every rejection
+    is reported in `violations`.
     """
+    mark("validation")
+
     if user != API_KEY:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid API key",
         )
 
+    mode = request.mode or FILTERS_MODE
+    if mode not in FILTER_MODES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid mode {mode}, expected one of {', '.join(FILTER_MODES)}",
+        )
+
     try:
-        # Map of filter names to their pipeline IDs
-        filter_map = {
-            "NSFW": "nsfw_filter_pipeline",
-            "Ban List": "ban_list_pipeline",
-            "Restrict to Topic": "restrict_to_topic_pipeline",
-            "Regex Pattern Match": "regex_filter_pipeline",
-            "Jailbreak Detection": "jailbreak_filter_pipeline",
-            "Bias Check": "bias_check_pipeline",
-            "Document Classifier": "document_classifier_pipeline"
+        filters = [
+            (filter_name, FILTER_PIPELINES[filter_name])
+            for filter_name in request.enabled_filters
+            if filter_name in FILTER_PIPELINES
+            and FILTER_PIPELINES[filter_name] in app.state.PIPELINES
+        ]
+
+        if mode == "collect":
+            messages = await run_filters_to_end(filters, request)
+            verdicts = [
+                {
+                    "filter": filter_name,
+                    "status": "success" if message is None else "error",
+                    "message": message,
+                }
+                for (filter_name, _), message in zip(filters, messages)
+            ]
+            violations = [
+                verdict for verdict in verdicts if verdict["status"] == "error"
+            ]
+            if violations:
+                return {
+                    "status": "error",
+                    "filter": violations[0]["filter"],
+                    "message": violations[0]["message"],
+                    "violations": violations,
+                    "verdicts": verdicts,
+                }
+            return {
+                "status": "success",
+                "body": request.body,
+                "verdicts": verdicts,
+            }
+
+        if mode == "concurrent":
+            rejection = await run_filters_concurrently(filters, request)
+        else:
+            if FILTERS_ORDER == "adaptive":
+                filters = FILTER_ORDERING.order(
+                    filters, filter_cost_hints([item[1] for item in filters])
+                )
+            response.headers["X-Filter-Order"] = ", ".join(
+                filter_name for filter_name, _ in filters
+            )
+
+            rejection = None
+            for filter_name, pipeline_id in filters:
+                message = await run_filter(filter_name, pipeline_id, request)
+                if message is not None:
+                    rejection = (filter_name, message)
+                    break
+
+        if rejection is not None:
+            return {
+                "status": "error",
+                "filter": rejection[0],
+                "message": rejection[1]
+            }
+
+        return {
+            "status": "success",
+            "body": request.body
+        }
+        
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": f"Error processing filters: {str(e)}"
         }
 
-        for filter_name in request.enabled_filters:
-            if filter_name not in filter_map:
+
+class PerformFiltersBatchItem(BaseModel):
+    body: dict
+    # Replace the shared config and enabled_filters for this item
+    config: Optional[dict] = None
+    enabled_filters: Optional[List[str]] = None
+
+
+class PerformFiltersBatchRequest(BaseModel):
+    items: List[PerformFiltersBatchItem]
+    config: dict = {}
+    enabled_filters: List[str] = []
+
+
+async def run_filter_batch(filter_name, pipeline_id, requests):
+    """
+    Runs one filter on many perform_filters requests, with a single call of
+    its `inlet_batch` if it has one, or else the inlet of each request
+    concurrently. Returns None or the rejection message for each request.
+
+    `inlet_batch(requests, user)` returns a list with, for each request,
+    what inlet would have returned or the exception it would have raised.
+    """
+    await ensure_ready(pipeline_id)
+    pipeline = get_module(pipeline_id)
+    if not hasattr(pipeline, "inlet_batch"):
+        return await asyncio.gather(
+            *[run_filter(filter_name, pipeline_id, request) for request in requests]
+        )
+
+    # Only requests without a cached verdict go to inlet_batch
+    messages = [None] * len(requests)
+    keys = [None] * len(requests)
+    misses = []
+    for index, request in enumerate(requests):
+        if VERDICTS.enabled:
+            keys[index] = verdict_key(pipeline_id, pipeline, request)
+        if keys[index] is not None:
+            cached, message = VERDICTS.get(keys[index])
+            if cached:
+                trace_cache_hit(pipeline_id, "inlet_batch", request.body, message)
+                if message is not None:
+                    FILTER_REJECTIONS.inc((pipeline_id,))
+                messages[index] = message
                 continue
-                
-            pipeline_id = filter_map[filter_name]
+        misses.append(index)
+    if not misses:
+        return messages
+
+    results, cacheable = await run_inlet_batch(
+        filter_name, pipeline_id, pipeline, [requests[index] for index in misses]
+    )
+    for index, message in zip(misses, results):
+        messages[index] = message
+        if cacheable and keys[index] is not None:
+            VERDICTS.put(keys[index], message)
+    return messages
+
+
+async def run_inlet_batch(filter_name, pipeline_id, pipeline, requests):
+    """
+    Calls a filter's inlet_batch. Returns None or the rejection message for
+    each request, and whether those are verdicts on the requests rather
+    than the failure of the whole call.
+    """
+    cacheable = True
+    async with pipeline_slot(pipeline_id, pipeline):
+        try:
+            with timed_hook(
+                pipeline_id,
+                "inlet_batch",
+                f"inlet_batch.{pipeline_id}",
+                filter_name,
+            ):
+                results = await call_hook(
+                    pipeline, "inlet_batch", requests, None
+                )
+            if len(results) != len(requests):
+                raise ValueError(
+                    f"inlet_batch returned {len(results)} results for {len(requests)} requests"
+                )
+        except Exception as e:
+            # Fails the whole batch, as inlet would have failed each request
+            results = [e] * len(requests)
+            cacheable = False
+
+    messages = []
+    for result in results:
+        if isinstance(result, Exception):
+            FILTER_REJECTIONS.inc((pipeline_id,))
+            messages.append(str(result))
+        else:
+            messages.append(None)
+    return messages, cacheable
+
 
-            if pipeline_id not in app.state.PIPELINES:
+@app.post("/v1/perform_filters/batch")
+@app.post("/perform_filters/batch")
+async def perform_filters_batch(
+    request: PerformFiltersBatchRequest, user: str = Depends(get_current_user)
+):
+    """
+    Performs the enabled filters on many message bodies
+
+    Each item uses the shared `config` and `enabled_filters` unless it has
+    its own. The filters run one after another, in the same order as
+    sequential perform_filters calls, each over all the items it is enabled
+    for that no earlier filter rejected. Returns one perform_filters result
+    per item.
+    """
+    mark("validation")
+
+    if user != API_KEY:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid API key",
+        )
+
+    try:
+        requests = [
+            PerformFiltersRequest(
+                enabled_filters=(
+                    request.enabled_filters
+                    if item.enabled_filters is None
+                    else item.enabled_filters
+                ),
+                config=request.config if item.config is None else item.config,
+                body=item.body,
+            )
+            for item in request.items
+        ]
+
+        filters = []
+        for item in requests:
+            for filter_name in item.enabled_filters:
+                if (
+                    filter_name in FILTER_PIPELINES
+                    and FILTER_PIPELINES[filter_name] in app.state.PIPELINES
+                    and (filter_name, FILTER_PIPELINES[filter_name]) not in filters
+                ):
+                    filters.append((filter_name, FILTER_PIPELINES[filter_name]))
+        if FILTERS_ORDER == "adaptive":
+            filters = FILTER_ORDERING.order(
+                filters, filter_cost_hints([item[1] for item in filters])
+            )
+
+        rejections = [None] * len(requests)
+        for filter_name, pipeline_id in filters:
+            indexes = [
+                index
+                for index, item in enumerate(requests)
+                if rejections[index] is None and filter_name in item.enabled_filters
+            ]
+            if not indexes:
                 continue
 
-            pipeline = PIPELINE_MODULES[pipeline_id]
-            
-            if hasattr(pipeline, "inlet"):
-                try:
-                    await pipeline.inlet(request, None)
-                except Exception as e:
-                    return {
+            messages = await run_filter_batch(
+                filter_name, pipeline_id, [requests[index] for index in indexes]
+            )
+            for index, message in zip(indexes, messages):
+                if message is not None:
+                    rejections[index] = (filter_name, message)
+
+        results = []
+        for item, rejection in zip(requests, rejections):
+            if rejection is None:
+                results.append({"status": "success", "body": item.body})
+            else:
+                results.append(
+                    {
                         "status": "error",
-                        "filter": filter_name,
-                        "message": str(e)
+                        "filter": rejection[0],
+                        "message": rejection[1],
                     }
-        
+                )
         return {
             "status": "success",
-            "body": request.body
+            "order": [filter_name for filter_name, _ in filters],
+            "results": results,
         }
-        
+
+    except HTTPException as e:
+        raise e
     except Exception as e:
         return {
             "status": "error",
             "message": f"Error processing filters: {str(e)}"
         }
+
+
+@app.get("/v1/perform_filters/cache")
+@app.get("/perform_filters/cache")
+async def get_verdict_cache(user: str = Depends(get_current_user)):
+    """
+    Returns the size of the verdict cache and its hits and misses per filter
+    """
+    if user == API_KEY:
+        return VERDICTS.status()
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid API key",
+        )
+
+
+@app.get("/v1/perform_filters/order")
+@app.get("/perform_filters/order")
+async def get_filter_order(user: str = Depends(get_current_user)):
+    """
+    Returns the order sequential perform_filters calls run the loaded filters
+    in, with the latency and rejection rate estimates behind it
+    """
+    if user == API_KEY:
+        filters = [
+            (filter_name, pipeline_id)
+            for filter_name, pipeline_id in FILTER_PIPELINES.items()
+            if pipeline_id in PIPELINE_MODULES
+        ]
+        cost_hints = filter_cost_hints([item[1] for item in filters])
+        if FILTERS_ORDER == "adaptive":
+            filters = FILTER_ORDERING.order(filters, cost_hints)
+        return {
+            "order": [filter_name for filter_name, _ in filters],
+            "filters": FILTER_ORDERING.status(cost_hints),
+        }
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid API key",
+        )
@@ -29,6 +29,10 @@ class Pipeline:
         self.type = "filter"
         self.name = "Ban List Filter"
         self.valves = self.Valves()
+        # Seconds per inlet call, until perform_filters has measured it
+        self.cost_hint = 0.001
+        # Verdicts depend on the message, the fuzziness and the ban list only
+        self.verdict_cache = {"valves": ["max_l_dist"], "config": ["ban_list"]}
 
     async def on_startup(self):
         print(f"on_startup: {__name__}")
@@ -10,9 +10,27 @@ requirements: transformers
 
 from typing import List, Optional
 from pydantic import BaseModel
-from transformers import AutoTokenizer, TFAutoModelForSequenceClassification, pipeline
+from utils.pipelines.inference import InferencePool
+from utils.pipelines.metrics import track_inference
 import os
 
+
+def load_model():
+    from transformers import AutoTokenizer, TFAutoModelForSequenceClassification, pipeline
+
+    model_name = "d4data/bias-detection-model"
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = TFAutoModelForSequenceClassification.from_pretrained(model_name)
+
+    bias_model = pipeline(
+        "text-classification",
+        model=model,
+        tokenizer=tokenizer
+    )
+    # Texts beyond the model's 512 tokens are truncated rather than failing the batch
+    return lambda texts: bias_model(texts, batch_size=len(texts), truncation=True)
+
+
 class Pipeline:
     class Valves(BaseModel):
         pipelines: List[str] = ["*"]
@@ -25,24 +43,22 @@ class Pipeline:
         
         self.valves = self.Valves()
         self.bias_model = None
+        # One TensorFlow classifier forward pass
+        self.cost_hint = 0.1
+        self.verdict_cache = {"valves": ["threshold"], "config": []}
 
     async def on_startup(self):
         print(f"on_startup: {__name__}")
         
-        model_name = "d4data/bias-detection-model"
-        tokenizer = AutoTokenizer.from_pretrained(model_name)
-        model = TFAutoModelForSequenceClassification.from_pretrained(model_name)
-        
-        self.bias_model = pipeline(
-            "text-classification",
-            model=model,
-            tokenizer=tokenizer
-        )
+        self.bias_model = InferencePool(__name__, __file__, "load_model")
+        await self.bias_model.start()
         
         print("Bias detection model loaded successfully.")
 
     async def on_shutdown(self):
         print(f"on_shutdown: {__name__}")
+        if self.bias_model:
+            await self.bias_model.stop()
 
     async def on_valves_updated(self):
         pass
@@ -50,29 +66,53 @@ class Pipeline:
     async def inlet(self, request: dict, user: Optional[dict] = None) -> dict:
         print(f"inlet: {__name__}")
 
-        body = request.body
-        messages = body.get("messages", [])
-
-        user_message = None
-        for message in reversed(messages):
-            if message.get("role") == "user":
-                user_message = message
-                break
-
-        if user_message:
-            content = user_message.get("content", "")
-            
-            if not content.strip():
-                raise Exception("Input message cannot be empty.")
-
-            result = self.bias_model(content)[0]
+        result = (await self.inlet_batch([request], user))[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    async def inlet_batch(self, requests: list, user: Optional[dict] = None) -> list:
+        """
+        Checks the last user message of many requests with one model call.
+        Returns the body of each request, or the exception inlet would have
+        raised for it.
+        """
+        results = []
+        pending = []
+        for request in requests:
+            body = request.body
+            messages = body.get("messages", [])
+
+            user_message = None
+            for message in reversed(messages):
+                if message.get("role") == "user":
+                    user_message = message
+                    break
+
+            if user_message:
+                content = user_message.get("content", "")
+
+                if not content.strip():
+                    results.append(Exception("Input message cannot be empty."))
+                    continue
+
+                pending.append((len(results), content))
+            results.append(body)
+
+        if not pending:
+            return results
+
+        contents = [content for _, content in pending]
+        with track_inference(__name__, "bias", " ".join(contents)):
+            scores = await self.bias_model.infer(contents)
+
+        for (index, _), result in zip(pending, scores):
             bias_score = result["score"]
             is_biased = result["label"] == "Biased"
 
             if is_biased and bias_score > self.valves.threshold:
-                raise Exception("Potentially biased content detected")
-
-        return body
+                results[index] = Exception("Potentially biased content detected")
+        return results
 
     async def outlet(self, body: dict, user: Optional[dict] = None) -> dict:
         messages = body.get("messages", [])
@@ -85,7 +125,8 @@ class Pipeline:
 
         if assistant_message:
             content = assistant_message.get("content", "")
-            result = self.bias_model(content)[0]
+            with track_inference(__name__, "bias", content):
+                result = (await self.bias_model.infer([content]))[0]
             bias_score = result["score"]
             is_biased = result["label"] == "LABEL_1"
 
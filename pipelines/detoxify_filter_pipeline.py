@@ -11,10 +11,27 @@ requirements: detoxify
 from typing import List, Optional
 from schemas import OpenAIChatMessage
 from pydantic import BaseModel
-from detoxify import Detoxify
+from utils.pipelines.inference import InferencePool
+from utils.pipelines.metrics import track_inference
 import os
 
 
+def load_model():
+    from detoxify import Detoxify
+
+    model = Detoxify("original")
+
+    def predict(texts):
+        # Detoxify returns a list of scores per label, split it into one dict per text
+        scores = model.predict(texts)
+        return [
+            {label: float(values[i]) for label, values in scores.items()}
+            for i in range(len(texts))
+        ]
+
+    return predict
+
+
 class Pipeline:
     class Valves(BaseModel):
         # List target pipeline ids (models) that this filter will be connected to.
@@ -47,6 +64,8 @@ class Pipeline:
         )
 
         self.model = None
+        # One classifier forward pass
+        self.cost_hint = 0.05
 
         pass
 
@@ -54,12 +73,15 @@ class Pipeline:
         # This function is called when the server is started.
         print(f"on_startup:{__name__}")
 
-        self.model = Detoxify("original")
+        self.model = InferencePool(__name__, __file__, "load_model")
+        await self.model.start()
         pass
 
     async def on_shutdown(self):
         # This function is called when the server is stopped.
         print(f"on_shutdown:{__name__}")
+        if self.model:
+            await self.model.stop()
         pass
 
     async def on_valves_updated(self):
@@ -74,7 +96,8 @@ class Pipeline:
         user_message = body["messages"][-1]["content"]
 
         # Filter out toxic messages
-        toxicity = self.model.predict(user_message)
+        with track_inference(__name__, "detoxify", user_message):
+            toxicity = (await self.model.infer([user_message]))[0]
         print(toxicity)
 
         if toxicity["toxicity"] > 0.5:
@@ -17,6 +17,7 @@ import jwt
 import datetime
 import os
 from transformers import AutoTokenizer
+from utils.pipelines.metrics import track_inference
 class Pipeline:
     class Valves(BaseModel):
         pipelines: List[str] = ["*"]
@@ -95,6 +96,13 @@ class Pipeline:
         }}
         """
 
+        # classify_document calls Vertex AI with the synchronous requests library
+        self.blocking = True
+        # A token exchange and a chat completion on Vertex AI
+        self.cost_hint = 2.0
+        # No verdict_cache: a failed Vertex AI call passes the input as an
+        # "Error" category, and that pass must not be served to repeats
+
     async def on_startup(self):
         print(f"on_startup: {__name__}")
         # Check if required environment variables are set
@@ -217,7 +225,8 @@ class Pipeline:
             }
             
             # Make the API request
-            response = requests.post(url, headers=headers, json=payload)
+            with track_inference(__name__, self.valves.model_id, text):
+                response = requests.post(url, headers=headers, json=payload)
             response.raise_for_status()
             
             # Parse the response
@@ -10,11 +10,38 @@ requirements: sentence-transformers, numpy, scikit-learn
 
 from typing import List, Optional
 from pydantic import BaseModel
-import numpy as np
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
+from utils.pipelines.inference import InferencePool
+from utils.pipelines.metrics import track_inference
 import os
 
+
+def load_model(model_name: str):
+    import csv
+    import numpy as np
+    from sentence_transformers import SentenceTransformer
+    from sklearn.metrics.pairwise import cosine_similarity
+
+    model = SentenceTransformer(model_name)
+
+    csv_path = os.path.join(os.path.dirname(__file__), "jailbreak_filter_pipeline", "jailbreak_prompts_2023_05_07.csv")
+    jailbreak_patterns = []
+
+    with open(csv_path, 'r', encoding='utf-8') as file:
+        reader = csv.DictReader(file)
+        for row in reader:
+            if row and row.get('prompt'):
+                jailbreak_patterns.append(row['prompt'])
+
+    jailbreak_embeddings = model.encode(jailbreak_patterns)
+
+    def max_similarity(texts):
+        text_embeddings = model.encode(texts)
+        similarities = cosine_similarity(text_embeddings, jailbreak_embeddings)
+        return [float(score) for score in np.max(similarities, axis=1)]
+
+    return max_similarity
+
+
 class Pipeline:
     class Valves(BaseModel):
         pipelines: List[str] = ["*"]
@@ -27,54 +54,66 @@ class Pipeline:
         self.name = "Jailbreak Detection Filter"
         self.valves = self.Valves()
         self.model = None
-        self.jailbreak_embeddings = None
+        # One embedding forward pass
+        self.cost_hint = 0.05
+        self.verdict_cache = {"valves": ["threshold", "model_name"], "config": []}
 
     async def on_startup(self):
         print(f"on_startup: {__name__}")
         
-        self.model = SentenceTransformer(self.valves.model_name)
-        
-        csv_path = os.path.join(os.path.dirname(__file__), "jailbreak_filter_pipeline", "jailbreak_prompts_2023_05_07.csv")
-        self.jailbreak_patterns = []
-
-        with open(csv_path, 'r', encoding='utf-8') as file:
-            import csv
-            reader = csv.DictReader(file)
-            for row in reader:
-                if row and row.get('prompt'):
-                    self.jailbreak_patterns.append(row['prompt'])
-        
-        self.jailbreak_embeddings = self.model.encode(self.jailbreak_patterns)
+        # The model and the embeddings of the known jailbreak prompts are
+        # loaded by the inference workers
+        self.model = InferencePool(
+            __name__, __file__, "load_model", args=(self.valves.model_name,)
+        )
+        await self.model.start()
 
     async def on_shutdown(self):
         print(f"on_shutdown: {__name__}")
+        if self.model:
+            await self.model.stop()
 
     async def on_valves_updated(self):
         pass
 
-    def check_similarity(self, text: str) -> float:
-        text_embedding = self.model.encode([text])[0]
-        
-        similarities = cosine_similarity([text_embedding], self.jailbreak_embeddings)[0]
-        
-        return np.max(similarities)
+    async def check_similarity(self, texts: List[str]) -> List[float]:
+        with track_inference(__name__, self.valves.model_name, " ".join(texts)):
+            return await self.model.infer(texts)
 
     async def inlet(self, request: dict, user: Optional[dict] = None) -> dict:
         print(f"inlet: {__name__}")
 
-        body = request.body
-        messages = body.get("messages", [])
-        
-        for message in reversed(messages):
-            if message.get("role") == "user":
-                content = message.get("content", "")
-                similarity_score = self.check_similarity(content)
-                
-                if similarity_score > self.valves.threshold:
-                    raise Exception(f"Potential jailbreak attempt detected")
-                break
-
-        return body
+        result = (await self.inlet_batch([request], user))[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    async def inlet_batch(self, requests: list, user: Optional[dict] = None) -> list:
+        """
+        Embeds the last user message of many requests in one model call.
+        Returns the body of each request, or the exception inlet would have
+        raised for it.
+        """
+        results = []
+        pending = []
+        for index, request in enumerate(requests):
+            body = request.body
+            messages = body.get("messages", [])
+
+            for message in reversed(messages):
+                if message.get("role") == "user":
+                    pending.append((index, message.get("content", "")))
+                    break
+            results.append(body)
+
+        if not pending:
+            return results
+
+        scores = await self.check_similarity([content for _, content in pending])
+        for (index, _), similarity_score in zip(pending, scores):
+            if similarity_score > self.valves.threshold:
+                results[index] = Exception(f"Potential jailbreak attempt detected")
+        return results
 
     async def outlet(self, request: dict, user: Optional[dict] = None) -> dict:
         return request
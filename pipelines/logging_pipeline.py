@@ -29,6 +29,8 @@ class Pipeline:
         self.type = "filter"
         self.name = "Logging Pipeline"
         self.valves = self.Valves()
+        # outlet posts every exchange to LOG_URL, with up to a 3s timeout
+        self.blocking = True
         pass
 
     async def on_startup(self):
@@ -10,10 +10,24 @@ requirements: transformers
 
 from typing import List, Optional
 from pydantic import BaseModel
-from transformers import pipeline as hf_pipeline
+from utils.pipelines.inference import InferencePool
+from utils.pipelines.metrics import track_inference
 import re
 import os
 
+
+def load_model():
+    from transformers import pipeline as hf_pipeline
+
+    nsfw_model = hf_pipeline(
+        "text-classification",
+        model="michellejieli/NSFW_text_classifier",
+        tokenizer="michellejieli/NSFW_text_classifier",
+    )
+    # The sentences of a message, and of concurrent messages, share one forward pass
+    return lambda texts: nsfw_model(texts, batch_size=len(texts), truncation=True)
+
+
 class Pipeline:
     class Valves(BaseModel):
         pipelines: List[str] = ["*"]  # Connect to all pipelines by default
@@ -26,21 +40,24 @@ class Pipeline:
         self.name = "NSFW Filter Pipeline"
         self.valves = self.Valves()
         self.nsfw_model = None
+        # One classifier forward pass per sentence batch
+        self.cost_hint = 0.05
+        # Repeated messages get their cached verdict (see utils/pipelines/verdicts.py)
+        self.verdict_cache = {"valves": ["threshold", "validation_method"], "config": []}
 
     async def on_startup(self):
         print(f"on_startup: {__name__}")
 
         # Load the NSFW classifier model
-        self.nsfw_model = hf_pipeline(
-            "text-classification",
-            model="michellejieli/NSFW_text_classifier",
-            tokenizer="michellejieli/NSFW_text_classifier",
-        )
+        self.nsfw_model = InferencePool(__name__, __file__, "load_model")
+        await self.nsfw_model.start()
 
         print("NSFW classifier model loaded successfully.")
 
     async def on_shutdown(self):
         print(f"on_shutdown: {__name__}")
+        if self.nsfw_model:
+            await self.nsfw_model.stop()
 
     async def on_valves_updated(self):
         pass
@@ -48,79 +65,77 @@ class Pipeline:
     async def inlet(self, request: dict, user: Optional[dict] = None) -> dict:
         print(f"inlet: {__name__}")
 
-        body = request.body
-        messages = body.get("messages", [])
-
-        # Manually extract the last user message
-        user_message = None
-        for message in reversed(messages):
-            if message.get("role") == "user":
-                user_message = message
-                break
-
-        if user_message:
-            content = user_message.get("content", "")
-
-            if not content.strip():
-                raise Exception("Input message cannot be empty.")
-
-            # Validate the content for NSFW text
-            validation_result = self.validate(content)
-
-            if not validation_result["is_safe"]:
-                raise Exception("NSFW content detected in the input message.")
-
-        return body
+        result = (await self.inlet_batch([request], user))[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    async def inlet_batch(self, requests: list, user: Optional[dict] = None) -> list:
+        """
+        Checks the last user message of many requests with one classifier
+        call. Returns the body of each request, or the exception inlet would
+        have raised for it.
+        """
+        results = []
+        pending = []
+        for request in requests:
+            body = request.body
+            messages = body.get("messages", [])
+
+            # Manually extract the last user message
+            user_message = None
+            for message in reversed(messages):
+                if message.get("role") == "user":
+                    user_message = message
+                    break
+
+            if user_message:
+                content = user_message.get("content", "")
+
+                if not content.strip():
+                    results.append(Exception("Input message cannot be empty."))
+                    continue
+
+                pending.append((len(results), self.split_text(content)))
+            results.append(body)
+
+        # Classify the texts of all requests in one batch
+        verdicts = await self.is_nsfw([text for _, texts in pending for text in texts])
+
+        offset = 0
+        for index, texts in pending:
+            if any(verdicts[offset:offset + len(texts)]):
+                results[index] = Exception("NSFW content detected in the input message.")
+            offset += len(texts)
+        return results
 
     async def outlet(self, request: dict, user: Optional[dict] = None) -> dict:
         return request
 
-    def validate(self, value: str) -> dict:
+    def split_text(self, value: str) -> List[str]:
         validation_method = self.valves.validation_method.lower()
         if validation_method not in ["sentence", "full"]:
             raise ValueError("validation_method must be 'sentence' or 'full'.")
 
-        if validation_method == "sentence":
-            return self.validate_each_sentence(value)
-        else:
-            return self.validate_full_text(value)
+        if validation_method == "full":
+            return [value]
 
-    def validate_each_sentence(self, value: str) -> dict:
         # Use regular expressions to split the text into sentences
         sentences = re.split(r'(?<=[.!?])\s+', value)
+        return [sentence.strip() for sentence in sentences if sentence.strip()]
 
-        nsfw_sentences = []
-        for sentence in sentences:
-            sentence = sentence.strip()
-            if sentence:
-                if self.is_nsfw(sentence):
-                    nsfw_sentences.append(sentence)
-
-        if nsfw_sentences:
-            return {
-                "is_safe": False,
-                "nsfw_sentences": nsfw_sentences,
-            }
-
-        return {"is_safe": True}
-
-    def validate_full_text(self, value: str) -> dict:
-        if self.is_nsfw(value):
-            return {"is_safe": False}
-        return {"is_safe": True}
-
-    def is_nsfw(self, text: str) -> bool:
+    async def is_nsfw(self, texts: List[str]) -> List[bool]:
+        if not texts:
+            return []
         threshold = self.valves.threshold
 
-        results = self.nsfw_model(text)
-        if not results:
-            return False
-
-        result = results[0]
-        label = result.get("label")
-        score = result.get("score")
+        with track_inference(__name__, "nsfw", " ".join(texts)):
+            results = await self.nsfw_model.infer(texts)
 
-        if label == "NSFW" and score > threshold:
-            return True
+        verdicts = []
+        for result in results:
+            label = result.get("label")
+            score = result.get("score")
+            verdicts.append(label == "NSFW" and score > threshold)
 
-        return False
+        return verdicts
@@ -24,6 +24,10 @@ class Pipeline:
         self.name = "Regex Filter Pipeline"
         self.valves = self.Valves()
         self.compiled_patterns = []
+        # Precompiled patterns match in well under a millisecond
+        self.cost_hint = 0.001
+        # The patterns come from the request config, not from the valves
+        self.verdict_cache = {"valves": ["case_sensitive"], "config": ["regex_filters"]}
 
     async def on_startup(self):
         print(f"on_startup: {__name__}")
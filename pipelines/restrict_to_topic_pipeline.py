@@ -10,7 +10,38 @@ requirements: transformers
 
 from typing import List, Optional
 from pydantic import BaseModel
-from transformers import pipeline
+from utils.pipelines.inference import InferencePool
+from utils.pipelines.metrics import track_inference
+
+
+def load_model():
+    from transformers import pipeline
+
+    classifier = pipeline(
+        "zero-shot-classification",
+        model="facebook/bart-large-mnli"
+    )
+
+    def classify(batch):
+        # Messages checked against the same topics share one batched call
+        groups = {}
+        for index, (message, labels) in enumerate(batch):
+            groups.setdefault(tuple(labels), []).append(index)
+
+        results = [None] * len(batch)
+        for labels, indexes in groups.items():
+            outputs = classifier(
+                [batch[index][0] for index in indexes],
+                candidate_labels=list(labels),
+                multi_label=True,
+                batch_size=len(indexes),
+            )
+            for index, output in zip(indexes, outputs):
+                results[index] = output
+        return results
+
+    return classify
+
 
 class Pipeline:
     class Valves(BaseModel):
@@ -25,19 +56,25 @@ class Pipeline:
         self.valves = self.Valves()
         
         self.classifier = None
+        # Zero-shot classification runs bart-large-mnli once per topic
+        self.cost_hint = 0.5
+        self.verdict_cache = {
+            "valves": ["threshold"],
+            "config": ["valid_topics", "invalid_topics"],
+        }
 
     async def on_startup(self):
         print(f"on_startup: {__name__}")
         
-        self.classifier = pipeline(
-            "zero-shot-classification",
-            model="facebook/bart-large-mnli"
-        )
+        self.classifier = InferencePool(__name__, __file__, "load_model")
+        await self.classifier.start()
         
         print("Topic classifier model loaded successfully.")
 
     async def on_shutdown(self):
         print(f"on_shutdown: {__name__}")
+        if self.classifier:
+            await self.classifier.stop()
 
     async def on_valves_updated(self):
         pass
@@ -45,41 +82,61 @@ class Pipeline:
     async def inlet(self, request: dict, user: Optional[dict] = None) -> dict:
         print(f"inlet: {__name__}")
 
-        body = request.body
-        config = request.config
-
-        valid_topics = config.get("valid_topics", [])
-        invalid_topics = config.get("invalid_topics", [])
-
-        if not valid_topics and not invalid_topics:
-            return request
-
-        message = body.get("text", "")
-
-        if message and message.strip():
+        result = (await self.inlet_batch([request], user))[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    async def inlet_batch(self, requests: list, user: Optional[dict] = None) -> list:
+        """
+        Classifies the text of many requests against their topics with one
+        model call. Returns each request, or the exception inlet would have
+        raised for it.
+        """
+        results = list(requests)
+        pending = []
+        batch = []
+        for index, request in enumerate(requests):
+            body = request.body
+            config = request.config
+
+            valid_topics = config.get("valid_topics", [])
+            invalid_topics = config.get("invalid_topics", [])
+
+            if not valid_topics and not invalid_topics:
+                continue
+
+            message = body.get("text", "")
+
+            if message and message.strip():
+                pending.append((index, bool(valid_topics), bool(invalid_topics)))
+                if valid_topics:
+                    batch.append((message, valid_topics))
+                if invalid_topics:
+                    batch.append((message, invalid_topics))
+
+        if not batch:
+            return results
+
+        with track_inference(__name__, "zero-shot", " ".join(item[0] for item in batch)):
+            classified = iter(await self.classifier.infer(batch))
+
+        for index, has_valid_topics, has_invalid_topics in pending:
             matches_valid_topic = True
             matches_invalid_topic = False
 
-            if valid_topics:
-                result = self.classifier(
-                    message,
-                    candidate_labels=valid_topics,
-                    multi_label=True
-                )
+            if has_valid_topics:
+                result = next(classified)
                 matches_valid_topic = any(score > self.valves.threshold for score in result['scores'])
 
-            if invalid_topics:
-                result = self.classifier(
-                    message,
-                    candidate_labels=invalid_topics,
-                    multi_label=True
-                )
+            if has_invalid_topics:
+                result = next(classified)
                 matches_invalid_topic = any(score > self.valves.threshold for score in result['scores'])
 
-            if (valid_topics and not matches_valid_topic and not invalid_topics) or matches_invalid_topic:
-                raise Exception("Message contains invalid topics or is not related to any valid topics.")
+            if (has_valid_topics and not matches_valid_topic and not has_invalid_topics) or matches_invalid_topic:
+                results[index] = Exception("Message contains invalid topics or is not related to any valid topics.")
 
-        return request
+        return results
 
     async def outlet(self, request: dict, user: Optional[dict] = None) -> dict:
         return request
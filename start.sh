@@ -91,27 +91,11 @@ download_pipelines() {
   fi
 }
 
-# Function to parse and install requirements from frontmatter
+# Function to install the frontmatter requirements of the given pipeline files.
+# Already satisfied requirements are skipped and the rest are installed in a
+# single batch (see utils/pipelines/requirements.py).
 install_frontmatter_requirements() {
-  local file=$1
-  local file_content=$(cat "$1")
-  # Extract the first triple-quoted block
-  local first_block=$(echo "$file_content" | awk '/"""/{flag=!flag; if(flag) count++; if(count == 2) {exit}} flag' )
-
-  # Check if the block contains requirements
-  local requirements=$(echo "$first_block" | grep -i 'requirements:')
-
-  if [ -n "$requirements" ]; then
-    # Extract the requirements list
-    requirements=$(echo "$requirements" | awk -F': ' '{print $2}' | tr ',' ' ' | tr -d '\r')
-
-    # Construct and echo the pip install command
-    local pip_command="pip install $requirements"
-    echo "$pip_command"
-    pip install $requirements
-  else
-    echo "No requirements found in frontmatter of $file."
-  fi
+  python -m utils.pipelines.requirements "$@"
 }
 
 
@@ -128,16 +112,28 @@ if [[ -n "$PIPELINES_URLS" ]]; then
     download_pipelines "$path" "$PIPELINES_DIR"
   done
 
-  for file in "$pipelines_dir"/*; do
-    if [[ -f "$file" ]]; then
-      install_frontmatter_requirements "$file"
-    fi
-  done
+  install_frontmatter_requirements "$PIPELINES_DIR"/*.py
 else
   echo "PIPELINES_URLS not specified. Skipping pipelines download and installation."
 fi
 
-# Start the server
+# Start the server. With PIPELINES_WORKERS > 1, pipelines are loaded once and
+# the server is forked into that many workers sharing the loaded models.
+if [ "${PIPELINES_WORKERS:-1}" -gt 1 ]; then
+  log "Starting $PIPELINES_WORKERS pre-forked uvicorn workers..."
+  if ! python -m utils.pipelines.prefork \
+      --workers "$PIPELINES_WORKERS" \
+      --host "$HOST" \
+      --port "$PORT" \
+      --forwarded-allow-ips '*' \
+      --timeout-keep-alive 75 \
+      --log-level info; then
+    log "ERROR: Failed to start uvicorn server"
+    exit 1
+  fi
+  exit 0
+fi
+
 log "Starting uvicorn server..."
 if ! uvicorn main:app \
     --host "$HOST" \
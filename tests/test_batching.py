@@ -0,0 +1,166 @@
+import asyncio
+
+import pytest
+
+from utils.pipelines.batching import MicroBatcher
+
+
+class Model:
+    """
+    Stands in for an inference pool: echoes its inputs after `delay` seconds
+    and records every batch and the most batches it ran at once.
+    """
+
+    def __init__(self, delay=0.01):
+        self.delay = delay
+        self.batches = []
+        self.running = 0
+        self.max_running = 0
+
+    async def __call__(self, batch):
+        self.batches.append(list(batch))
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.running -= 1
+        return [f"result {item}" for item in batch]
+
+
+def run(coroutine, timeout=2.0):
+    async def main():
+        return await asyncio.wait_for(coroutine(), timeout)
+
+    return asyncio.run(main())
+
+
+@pytest.mark.parametrize("max_wait", [0.0, 0.005])
+def test_submit_larger_than_max_batch_size(max_wait):
+    model = Model()
+    batcher = MicroBatcher("test", model, max_wait, 32, length=lambda item: 0)
+    items = [str(index) for index in range(40)]
+
+    async def main():
+        return await batcher.submit(items)
+
+    assert run(main) == [f"result {item}" for item in items]
+    assert [len(batch) for batch in model.batches] == [32, 8]
+    assert batcher._pending == []
+
+
+def test_timer_flushes_a_partial_batch():
+    model = Model()
+    batcher = MicroBatcher("test", model, 0.05, 32, length=lambda item: 0)
+
+    async def main():
+        return await asyncio.gather(batcher.submit(["a"]), batcher.submit(["b", "c"]))
+
+    assert run(main) == [["result a"], ["result b", "result c"]]
+    assert model.batches == [["a", "b", "c"]]
+
+
+def test_full_batch_does_not_wait_for_the_timer():
+    model = Model()
+    batcher = MicroBatcher("test", model, 60.0, 4, length=lambda item: 0)
+
+    async def main():
+        return await batcher.submit(["a", "b", "c", "d"])
+
+    assert run(main, timeout=1.0) == ["result a", "result b", "result c", "result d"]
+
+
+def test_concurrency_limits_batches_in_flight():
+    model = Model(delay=0.02)
+    batcher = MicroBatcher(
+        "test", model, 0.0, 2, length=lambda item: 0, concurrency=2
+    )
+
+    async def main():
+        return await asyncio.gather(
+            *[batcher.submit([str(index)]) for index in range(20)]
+        )
+
+    assert run(main) == [[f"result {index}"] for index in range(20)]
+    assert model.max_running == 2
+    # Inputs submitted while both slots were busy were merged
+    assert max(len(batch) for batch in model.batches) == 2
+    assert sum(len(batch) for batch in model.batches) == 20
+
+
+def test_inputs_are_grouped_by_length():
+    model = Model()
+    batcher = MicroBatcher("test", model, 0.01, 32, max_padding=4.0)
+    short, long = ["ab", "abc"], ["x" * 100, "y" * 120]
+
+    async def main():
+        return await asyncio.gather(batcher.submit(short), batcher.submit(long))
+
+    assert run(main) == [
+        [f"result {item}" for item in short],
+        [f"result {item}" for item in long],
+    ]
+    assert sorted(model.batches) == sorted([short, long])
+
+
+class Crashed(Exception):
+    pass
+
+
+def failing_model(batches, error=RuntimeError):
+    async def model(batch):
+        batches.append(list(batch))
+        if "boom" in batch:
+            raise error("model failed")
+        return [f"result {item}" for item in batch]
+
+    return model
+
+
+def test_callers_are_isolated_from_each_others_failures():
+    batches = []
+    batcher = MicroBatcher(
+        "test", failing_model(batches), 0.01, 32, length=lambda item: 0
+    )
+
+    async def main():
+        return await asyncio.gather(
+            batcher.submit(["ab"]),
+            batcher.submit(["boom", "c"]),
+            batcher.submit(["abcd"]),
+            return_exceptions=True,
+        )
+
+    first, second, third = run(main)
+    assert first == ["result ab"]
+    assert isinstance(second, RuntimeError)
+    assert third == ["result abcd"]
+    # The merged batch, then each caller on its own
+    assert batches == [["ab", "boom", "c", "abcd"], ["ab"], ["boom", "c"], ["abcd"]]
+
+
+def test_single_caller_is_retried_only_on_retry_on_errors():
+    batches = []
+    batcher = MicroBatcher(
+        "test", failing_model(batches), 0.01, 32, length=lambda item: 0
+    )
+
+    async def main():
+        return await batcher.submit(["boom"])
+
+    with pytest.raises(RuntimeError):
+        run(main)
+    assert batches == [["boom"]]
+
+    batches.clear()
+    batcher = MicroBatcher(
+        "test",
+        failing_model(batches, Crashed),
+        0.01,
+        32,
+        length=lambda item: 0,
+        retry_on=(Crashed,),
+    )
+    with pytest.raises(Crashed):
+        run(main)
+    assert batches == [["boom"], ["boom"]]
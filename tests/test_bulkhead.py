@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+
+from utils.pipelines.bulkhead import Bulkhead, BulkheadFull
+
+
+def test_waiters_get_slots_in_order_and_overflow_is_rejected():
+    bulkhead = Bulkhead("test", max_concurrency=1, max_queue=1)
+
+    async def main():
+        await bulkhead.acquire()
+        waiter = asyncio.ensure_future(bulkhead.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(BulkheadFull):
+            await bulkhead.acquire()
+
+        bulkhead.release()
+        await waiter
+        return bulkhead.status()
+
+    status = asyncio.run(main())
+    assert status["active"] == 1
+    assert status["queued"] == 0
+    assert status["admitted"] == 2
+    assert status["rejected"] == 1
+
+
+def test_cancelled_waiter_dropped_by_release():
+    bulkhead = Bulkhead("test", max_concurrency=1, max_queue=2)
+
+    async def main():
+        await bulkhead.acquire()
+        cancelled = asyncio.ensure_future(bulkhead.acquire())
+        waiting = asyncio.ensure_future(bulkhead.acquire())
+        await asyncio.sleep(0)
+
+        # release() pops the cancelled waiter before its acquire() unwinds
+        cancelled.cancel()
+        bulkhead.release()
+
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        await waiting
+        return bulkhead.status()
+
+    status = asyncio.run(main())
+    assert status["active"] == 1
+    assert status["queued"] == 0
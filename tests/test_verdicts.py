@@ -0,0 +1,165 @@
+from types import SimpleNamespace
+from typing import List
+
+import asyncio
+import importlib.util
+import os
+
+from pydantic import BaseModel
+
+from utils.pipelines.verdicts import VerdictCache, verdict_key
+
+
+PIPELINES_DIR = os.path.join(os.path.dirname(__file__), "..", "pipelines")
+
+
+class Filter:
+    class Valves(BaseModel):
+        pipelines: List[str] = ["*"]
+        priority: int = 0
+        threshold: float = 0.5
+        model_name: str = "small"
+
+    def __init__(self, verdict_cache):
+        self.valves = self.Valves()
+        self.verdict_cache = verdict_cache
+
+
+def make_request(text, config=None, messages=None):
+    body = {"text": text}
+    if messages is not None:
+        body = {"messages": messages}
+    return SimpleNamespace(body=body, config=config or {})
+
+
+def load_pipeline(name):
+    spec = importlib.util.spec_from_file_location(
+        name, os.path.join(PIPELINES_DIR, f"{name}.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.Pipeline()
+
+
+def test_filters_without_verdict_cache_are_not_cached():
+    pipeline = Filter(None)
+    assert verdict_key("filter", pipeline, make_request("hello")) is None
+
+
+def test_distinct_texts_get_distinct_keys():
+    pipeline = Filter({"valves": [], "config": []})
+    texts = ["hello", "hello world", "Hello", "rm -rf", "rm  -rf", "rm -rf ", ""]
+    keys = {verdict_key("filter", pipeline, make_request(text)) for text in texts}
+    assert len(keys) == len(texts)
+
+
+def test_unicode_forms_get_distinct_keys():
+    pipeline = Filter({"valves": [], "config": []})
+    composed, decomposed = "caf\u00e9", "cafe\u0301"
+    assert verdict_key("filter", pipeline, make_request(composed)) != verdict_key(
+        "filter", pipeline, make_request(decomposed)
+    )
+
+
+def test_last_user_message_is_part_of_the_key():
+    pipeline = Filter({"valves": [], "config": []})
+
+    def key(content):
+        messages = [
+            {"role": "user", "content": "first"},
+            {"role": "assistant", "content": "reply"},
+            {"role": "user", "content": content},
+        ]
+        return verdict_key("filter", pipeline, make_request(None, messages=messages))
+
+    assert key("second") == key("second")
+    assert key("second") != key("other")
+
+
+def test_only_declared_valves_are_part_of_the_key():
+    pipeline = Filter({"valves": ["threshold"], "config": []})
+    request = make_request("hello")
+    key = verdict_key("filter", pipeline, request)
+
+    pipeline.valves.model_name = "large"
+    assert verdict_key("filter", pipeline, request) == key
+
+    pipeline.valves.threshold = 0.9
+    assert verdict_key("filter", pipeline, request) != key
+
+
+def test_all_valves_except_routing_ones_with_none():
+    pipeline = Filter({"valves": None, "config": []})
+    request = make_request("hello")
+    key = verdict_key("filter", pipeline, request)
+
+    pipeline.valves.pipelines = ["llama3"]
+    pipeline.valves.priority = 1
+    assert verdict_key("filter", pipeline, request) == key
+
+    pipeline.valves.model_name = "large"
+    assert verdict_key("filter", pipeline, request) != key
+
+
+def test_only_declared_config_keys_are_part_of_the_key():
+    pipeline = Filter({"valves": [], "config": ["ban_list"]})
+
+    def key(config):
+        return verdict_key("filter", pipeline, make_request("hello", config))
+
+    assert key({"ban_list": ["a"]}) == key({"ban_list": ["a"], "other": 1})
+    assert key({"ban_list": ["a"]}) != key({"ban_list": ["b"]})
+
+    pipeline.verdict_cache = {"valves": [], "config": None}
+    assert key({"ban_list": ["a"]}) != key({"ban_list": ["a"], "other": 1})
+
+
+def test_whitespace_variant_is_not_served_a_cached_pass():
+    pipeline = load_pipeline("regex_filter_pipeline")
+    cache = VerdictCache(max_entries=100, ttl=60)
+    config = {"regex_filters": ["rm  -rf"]}
+
+    def check(text):
+        request = make_request(
+            None, config, messages=[{"role": "user", "content": text}]
+        )
+        key = verdict_key("regex_filter_pipeline", pipeline, request)
+        cached, message = cache.get(key)
+        if cached:
+            return message
+        try:
+            asyncio.run(pipeline.inlet(request))
+            message = None
+        except Exception as e:
+            message = str(e)
+        cache.put(key, message)
+        return message
+
+    assert check("rm -rf") is None
+    assert check("rm  -rf") is not None
+    assert cache.status()["entries"] == 2
+
+
+def test_cache_evicts_least_recently_used_and_expires():
+    cache = VerdictCache(max_entries=2, ttl=60)
+    cache.put(("a", "1"), None)
+    cache.put(("a", "2"), "rejected")
+    assert cache.get(("a", "1")) == (True, None)
+
+    cache.put(("b", "3"), None)
+    assert cache.get(("a", "2")) == (False, None)
+    assert cache.get(("a", "1")) == (True, None)
+
+    cache.ttl = -1
+    cache.put(("a", "4"), None)
+    assert cache.get(("a", "4")) == (False, None)
+
+
+def test_invalidate_drops_one_pipeline():
+    cache = VerdictCache(max_entries=10, ttl=60)
+    cache.put(("a", "1"), None)
+    cache.put(("b", "1"), "rejected")
+
+    cache.invalidate("a")
+    assert cache.get(("a", "1")) == (False, None)
+    assert cache.get(("b", "1")) == (True, "rejected")
@@ -0,0 +1,202 @@
+from typing import Any, Awaitable, Callable, List, Optional, Sequence, Tuple, Type
+
+from utils.pipelines.metrics import METRICS
+
+import asyncio
+
+
+BATCH_SIZE = METRICS.histogram(
+    "pipelines_inference_batch_size",
+    "Inputs per batch sent to a pipeline's inference workers",
+    ("pipeline",),
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+
+
+def input_length(item: Any) -> int:
+    """
+    Length of one model input, e.g. a text or a (text, labels) tuple.
+    """
+    if isinstance(item, (tuple, list)) and item:
+        item = item[0]
+    return len(item) if isinstance(item, str) else 0
+
+
+class MicroBatcher:
+    """
+    Merges the inputs of concurrent calls into larger batches.
+
+    Inputs submitted by different callers wait until `max_wait` seconds have
+    passed since the first of them, or until `max_batch_size` are waiting,
+    and then run as one batch through `run` (a list of inputs to a list with
+    one result per input). Every caller gets back the results of its own
+    inputs.
+
+    At most `concurrency` batches run at once, typically one per inference
+    worker. While they are all busy, new inputs keep collecting, and the
+    next batch is sent as soon as one finishes. Waiting inputs are sorted by
+    length and only those whose length is within `max_padding` times that
+    of the shortest go in the same batch, so short texts are not padded to
+    the length of long ones. The batch holding the oldest input goes first.
+
+    One caller's bad input must not fail the others: when a batch of several
+    callers fails, the inputs of each caller are run again on their own, and
+    only those that fail again get the error. A batch of a single caller is
+    run again only if it failed with one of `retry_on`.
+
+    A batcher belongs to the event loop it is first used on.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        run: Callable[[list], Awaitable[list]],
+        max_wait: float,
+        max_batch_size: int,
+        length: Callable[[Any], int] = input_length,
+        max_padding: float = 4.0,
+        concurrency: int = 1,
+        retry_on: Tuple[Type[BaseException], ...] = (),
+    ):
+        self.name = name
+        self.run = run
+        self.max_wait = max_wait
+        self.max_batch_size = max(1, max_batch_size)
+        self.length = length
+        self.max_padding = max_padding
+        self.concurrency = max(1, concurrency)
+        self.retry_on = retry_on
+        self.running = 0
+
+        # (input, its future, the caller that submitted it)
+        self._pending: List[Tuple[Any, asyncio.Future, object]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._expired = False
+        self._tasks = set()
+
+    async def submit(self, items: Sequence[Any]) -> list:
+        """
+        Returns the results of `items` once the batches they joined have run.
+        """
+        loop = asyncio.get_running_loop()
+        caller = object()
+        futures = []
+        for item in items:
+            future = loop.create_future()
+            self._pending.append((item, future, caller))
+            futures.append(future)
+
+        if len(self._pending) >= self.max_batch_size:
+            self._dispatch()
+        elif self._timer is None and not self._expired:
+            self._timer = loop.call_later(self.max_wait, self._expire)
+
+        return await asyncio.gather(*futures)
+
+    def _expire(self):
+        self._timer = None
+        self._expired = True
+        self._dispatch()
+
+    def _dispatch(self):
+        while self.running < self.concurrency:
+            # Inputs of callers that were cancelled meanwhile are dropped
+            self._pending = [entry for entry in self._pending if not entry[1].done()]
+            if not self._pending:
+                break
+
+            batch = self._next_batch()
+            self.running += 1
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        if not self._pending:
+            self._expired = False
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        elif self._timer is None and not self._expired:
+            # Inputs left over from a full batch wait like any others
+            self._timer = asyncio.get_running_loop().call_later(
+                self.max_wait, self._expire
+            )
+
+    def _next_batch(self) -> list:
+        oldest = self._pending[0][1]
+        batch = next(
+            batch
+            for batch in self.split(self._pending)
+            if any(entry[1] is oldest for entry in batch)
+        )
+        taken = {id(entry[1]) for entry in batch}
+        self._pending = [entry for entry in self._pending if id(entry[1]) not in taken]
+        return batch
+
+    def split(self, pending: list) -> List[list]:
+        pending = sorted(pending, key=lambda entry: self.length(entry[0]))
+
+        batches = []
+        batch, shortest = [], 0
+        for entry in pending:
+            length = self.length(entry[0])
+            if batch and (
+                len(batch) >= self.max_batch_size
+                or length > max(shortest, 1) * self.max_padding
+            ):
+                batches.append(batch)
+                batch = []
+            if not batch:
+                shortest = length
+            batch.append(entry)
+        if batch:
+            batches.append(batch)
+        return batches
+
+    async def _run(self, batch: list):
+        BATCH_SIZE.observe(len(batch), (self.name,))
+        try:
+            try:
+                await self._resolve(batch)
+            except Exception as e:
+                callers = {}
+                for entry in batch:
+                    callers.setdefault(entry[2], []).append(entry)
+                if len(callers) == 1 and not isinstance(e, self.retry_on):
+                    self._fail(batch, e)
+                    return
+
+                for entries in callers.values():
+                    # Callers that were cancelled meanwhile are not run again
+                    entries = [entry for entry in entries if not entry[1].done()]
+                    if not entries:
+                        continue
+                    try:
+                        await self._resolve(entries)
+                    except Exception as e:
+                        self._fail(entries, e)
+        except BaseException:
+            for entry in batch:
+                entry[1].cancel()
+            raise
+        finally:
+            self.running -= 1
+            # Inputs that waited while every slot was busy go right away
+            if self._expired or len(self._pending) >= self.max_batch_size:
+                self._dispatch()
+
+    async def _resolve(self, batch: list):
+        results = await self.run([entry[0] for entry in batch])
+        if len(results) != len(batch):
+            raise ValueError(
+                f"{self.name} returned {len(results)} results for {len(batch)} inputs"
+            )
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    @staticmethod
+    def _fail(batch: list, error: Exception):
+        for _, future, _ in batch:
+            if not future.done():
+                future.set_exception(error)
@@ -0,0 +1,131 @@
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional, Tuple
+
+import asyncio
+import time
+
+
+class BulkheadFull(Exception):
+    def __init__(self, name: str):
+        self.name = name
+        super().__init__(f"Too many concurrent requests for {name}")
+
+
+class Bulkhead:
+    """
+    Limits how many requests run inside one pipeline at once.
+
+    Up to `max_concurrency` callers hold a slot; up to `max_queue` more wait
+    for one in FIFO order. Further callers are rejected immediately with
+    BulkheadFull, so a slow pipeline cannot absorb every worker and request.
+    A `max_concurrency` of 0 disables the limit.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+        self.admitted = 0
+        self.rejected = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def configure(self, max_concurrency: int, max_queue: int):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        while self._waiters and self._has_capacity():
+            self._wake_next()
+
+    def _has_capacity(self) -> bool:
+        return self.max_concurrency <= 0 or self.active < self.max_concurrency
+
+    def _wake_next(self):
+        waiter = self._waiters.popleft()
+        if not waiter.done():
+            self.active += 1
+            waiter.set_result(None)
+
+    async def acquire(self) -> float:
+        """
+        Takes a slot, waiting in the queue if needed. Returns the time spent
+        queued in seconds.
+        """
+        if self._has_capacity() and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return 0.0
+
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise BulkheadFull(self.name)
+
+        start_time = time.perf_counter()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just before the cancellation
+                self.release()
+            elif waiter in self._waiters:
+                # Unless release() already dropped it from the queue
+                self._waiters.remove(waiter)
+            raise
+
+        wait_time = time.perf_counter() - start_time
+        self.admitted += 1
+        self.queue_wait_total += wait_time
+        self.queue_wait_max = max(self.queue_wait_max, wait_time)
+        return wait_time
+
+    def release(self):
+        self.active -= 1
+        while self._waiters and self._has_capacity():
+            self._wake_next()
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def status(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "queue_wait_total": self.queue_wait_total,
+            "queue_wait_max": self.queue_wait_max,
+        }
+
+
+def parse_limits(value: str) -> Dict[str, Tuple[int, Optional[int]]]:
+    """
+    Parses "pipeline_id=concurrency[:queue],..." into {pipeline_id: limits}.
+    """
+    limits = {}
+    for item in value.split(","):
+        if "=" not in item:
+            continue
+        pipeline_id, limit = item.split("=", 1)
+        concurrency, _, queue = limit.partition(":")
+        limits[pipeline_id.strip()] = (
+            int(concurrency),
+            int(queue) if queue.strip() else None,
+        )
+    return limits
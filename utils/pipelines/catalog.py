@@ -0,0 +1,168 @@
+from fastapi.concurrency import run_in_threadpool
+from typing import Callable, Dict, List, Optional
+
+import asyncio
+import logging
+import time
+
+
+class CatalogEntry:
+    def __init__(self):
+        self.pipelines: List[dict] = []
+        self.updated_at: Optional[float] = None
+        self.attempted_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self.refreshing: Optional[asyncio.Task] = None
+
+    def age(self) -> Optional[float]:
+        if self.updated_at is None:
+            return None
+        return time.monotonic() - self.updated_at
+
+
+class ManifoldCatalog:
+    """
+    Background-refreshed model lists of manifold pipelines.
+
+    Manifolds whose `pipelines` is a function usually fetch their model list
+    from an upstream API. The catalog calls it off the request path on a fixed
+    interval and always serves the last list that was fetched successfully.
+    """
+
+    def __init__(
+        self,
+        interval: float,
+        timeout: float,
+        on_change: Callable[[], None],
+    ):
+        self.interval = interval
+        self.timeout = timeout
+        self.on_change = on_change
+        self.entries: Dict[str, CatalogEntry] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._refreshes = set()
+
+    @staticmethod
+    def is_dynamic(pipeline) -> bool:
+        return getattr(pipeline, "type", None) == "manifold" and callable(
+            getattr(pipeline, "pipelines", None)
+        )
+
+    def get(self, pipeline_id: str) -> List[dict]:
+        entry = self.entries.get(pipeline_id)
+        return entry.pipelines if entry else []
+
+    def prune(self, pipeline_ids) -> None:
+        for pipeline_id in list(self.entries.keys()):
+            if pipeline_id not in pipeline_ids:
+                entry = self.entries.pop(pipeline_id)
+                if entry.refreshing:
+                    entry.refreshing.cancel()
+
+    async def refresh(self, pipeline_id: str, pipeline) -> bool:
+        """
+        Fetches the model list of one manifold, returning True if it changed.
+
+        Concurrent refreshes of the same manifold share a single fetch.
+        """
+        entry = self.entries.setdefault(pipeline_id, CatalogEntry())
+
+        if entry.refreshing is None or entry.refreshing.done():
+            entry.refreshing = asyncio.create_task(
+                self._fetch(pipeline_id, entry, pipeline)
+            )
+
+        return await asyncio.shield(entry.refreshing)
+
+    async def _fetch(self, pipeline_id: str, entry: CatalogEntry, pipeline) -> bool:
+        entry.attempted_at = time.monotonic()
+        try:
+            pipelines = await asyncio.wait_for(
+                run_in_threadpool(pipeline.pipelines), timeout=self.timeout
+            )
+        except Exception as e:
+            # Keep serving the last good list
+            entry.error = str(e) or e.__class__.__name__
+            logging.warning(
+                f"Failed to refresh catalog of {pipeline_id}: {entry.error}"
+            )
+            return False
+
+        entry.error = None
+        entry.updated_at = time.monotonic()
+
+        pipelines = list(pipelines or [])
+        if pipelines == entry.pipelines:
+            return False
+
+        entry.pipelines = pipelines
+        return True
+
+    async def refresh_all(self, modules: dict) -> bool:
+        dynamic = {
+            pipeline_id: pipeline
+            for pipeline_id, pipeline in modules.items()
+            if self.is_dynamic(pipeline)
+        }
+        self.prune(dynamic.keys())
+
+        results = await asyncio.gather(
+            *[
+                self.refresh(pipeline_id, pipeline)
+                for pipeline_id, pipeline in dynamic.items()
+            ]
+        )
+
+        changed = any(results)
+        if changed:
+            self.on_change()
+        return changed
+
+    def refresh_soon(self, modules: dict) -> None:
+        """
+        Refreshes every manifold in the background, e.g. after a valves update.
+        """
+        task = asyncio.create_task(self.refresh_all(modules))
+        self._refreshes.add(task)
+        task.add_done_callback(self._refreshed)
+
+    def _refreshed(self, task: asyncio.Task) -> None:
+        self._refreshes.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logging.error(f"Catalog refresh failed: {task.exception()}")
+
+    def start(self, get_modules: Callable[[], dict]) -> None:
+        if self.interval <= 0 or self._task is not None:
+            return
+
+        async def run():
+            while True:
+                await asyncio.sleep(self.interval)
+                try:
+                    await self.refresh_all(get_modules())
+                except Exception as e:
+                    logging.error(f"Catalog refresh failed: {e}")
+
+        self._task = asyncio.create_task(run())
+
+    async def stop(self) -> None:
+        tasks = list(self._refreshes)
+        if self._task is not None:
+            tasks.append(self._task)
+            self._task = None
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def status(self) -> List[dict]:
+        return [
+            {
+                "id": pipeline_id,
+                "models": len(entry.pipelines),
+                "age": entry.age(),
+                "error": entry.error,
+                "refreshing": bool(entry.refreshing and not entry.refreshing.done()),
+            }
+            for pipeline_id, entry in self.entries.items()
+        ]
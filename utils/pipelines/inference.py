@@ -0,0 +1,440 @@
+from concurrent.futures import Future
+from typing import Any, Callable, List, Sequence
+
+from config import (
+    INFERENCE_BATCH_SIZE,
+    INFERENCE_BATCH_WAIT_MS,
+    INFERENCE_THREADS,
+    INFERENCE_WORKERS,
+)
+from utils.pipelines.batching import MicroBatcher, input_length
+from utils.pipelines.metrics import METRICS
+
+import asyncio
+import importlib.util
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+import weakref
+
+
+# A worker that dies sooner than this after starting is restarted only after
+# this delay, so a model that crashes on load is not reloaded in a tight loop
+RESTART_DELAY = 1.0
+
+# Seconds a stopping worker gets to exit before it is terminated
+STOP_TIMEOUT = 5.0
+
+# Environment variables that size the thread pools of common model runtimes
+THREAD_VARIABLES = (
+    "OMP_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "TF_NUM_INTRAOP_THREADS",
+)
+
+INFERENCE_RESTARTS = METRICS.counter(
+    "pipelines_inference_worker_restarts_total",
+    "Inference worker processes restarted after they died",
+    ("pipeline",),
+)
+
+
+class InferenceError(Exception):
+    pass
+
+
+class WorkerCrashed(InferenceError):
+    pass
+
+
+def _load_factory(module_path: str, factory: str):
+    module_name = f"inference_{os.path.splitext(os.path.basename(module_path))[0]}"
+    spec = importlib.util.spec_from_file_location(module_name, module_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return getattr(module, factory)
+
+
+def _serve(conn, module_path: str, factory: str, args: tuple, threads: int):
+    """
+    Main function of a worker process: loads the model, then answers batches
+    until the pipe is closed or a None is received.
+    """
+    # Ctrl+C reaches the whole process group, the pool stops its workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if threads > 0:
+        for variable in THREAD_VARIABLES:
+            os.environ[variable] = str(threads)
+
+    try:
+        handler = _load_factory(module_path, factory)(*args)
+    except Exception as e:
+        conn.send((False, f"{type(e).__name__}: {e}"))
+        return
+    conn.send((True, None))
+
+    while True:
+        try:
+            batch = conn.recv()
+        except EOFError:
+            return
+        if batch is None:
+            return
+
+        try:
+            results = list(handler(batch))
+            if len(results) != len(batch):
+                raise InferenceError(
+                    f"{factory} returned {len(results)} results for {len(batch)} inputs"
+                )
+            conn.send((True, results))
+        except Exception as e:
+            conn.send((False, f"{type(e).__name__}: {e}"))
+
+
+class _Job:
+    def __init__(self, batch: list):
+        self.batch = batch
+        self.future = Future()
+
+
+class InferencePool:
+    """
+    Hosts a pipeline's model in separate worker processes, so that inference
+    neither holds the GIL of the API process nor runs on its event loop.
+
+    `factory` names a function in the pipeline file at `module_path`. Each
+    worker process imports that file, calls `factory(*args)` once to load the
+    model and gets back a handler that maps a batch (a list of inputs) to a
+    list with one result per input, e.g.
+
+        def load_model():
+            classifier = hf_pipeline("text-classification", model=...)
+            return lambda texts: classifier(texts)
+
+    Only the workers call the factory, so model libraries imported inside it
+    (e.g. transformers) are never loaded by the API process.
+
+    Batches and results are pickled over a pipe. Each worker runs one batch
+    at a time; idle workers take the next batch from a queue shared by the
+    pool. A worker that dies is restarted on its own, and the batch it was
+    running is retried once on the next free worker.
+
+    Unless `batch_size` is 1, the inputs of concurrent infer() calls are
+    merged into batches of up to `batch_size` inputs by a MicroBatcher,
+    grouped by the `length` of each input, so that one forward pass serves
+    several requests. A merged batch that fails or crashes its worker is not
+    retried as a whole: the inputs of each call are retried on their own, so
+    an input that breaks the model only fails its own call.
+
+    Pools belong to one process: after a fork, the child starts workers of
+    its own. The pre-fork server stops the parent's workers with
+    suspend_pools() before forking, and each forked API worker starts its own
+    with resume_pools() before it serves requests.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        module_path: str,
+        factory: str,
+        args: Sequence[Any] = (),
+        workers: int = INFERENCE_WORKERS,
+        threads: int = INFERENCE_THREADS,
+        batch_wait: float = INFERENCE_BATCH_WAIT_MS / 1000,
+        batch_size: int = INFERENCE_BATCH_SIZE,
+        length: Callable[[Any], int] = input_length,
+    ):
+        self.name = name
+        self.module_path = os.path.abspath(module_path)
+        self.factory = factory
+        self.args = tuple(args)
+        self.workers = workers
+        self.threads = threads
+        self.batch_wait = batch_wait
+        self.batch_size = batch_size
+        self.length = length
+        self.busy = 0
+
+        self._context = multiprocessing.get_context("spawn")
+        self._reset()
+        _POOLS.add(self)
+
+    def _reset(self):
+        self._jobs = queue.SimpleQueue()
+        self._threads: List[threading.Thread] = []
+        self._processes = {}
+        self._ready: List[Future] = []
+        self._running = 0
+        self._lock = threading.Lock()
+        self._stopping = False
+        self._batcher = None
+        if self.batch_size > 1:
+            self._batcher = MicroBatcher(
+                self.name,
+                lambda batch: self._infer(batch, retry=False),
+                self.batch_wait,
+                self.batch_size,
+                self.length,
+                concurrency=self.workers,
+                retry_on=(WorkerCrashed,),
+            )
+
+    def _ensure_started(self):
+        if self._threads or self._stopping:
+            return
+
+        for index in range(self.workers):
+            ready = Future()
+            thread = threading.Thread(
+                target=self._run_worker,
+                args=(index, ready),
+                name=f"inference-{self.name}-{index}",
+                daemon=True,
+            )
+            self._ready.append(ready)
+            self._threads.append(thread)
+            with self._lock:
+                self._running += 1
+            thread.start()
+
+    async def start(self):
+        """
+        Starts the workers and waits until all of them have loaded the model.
+        """
+        self._ensure_started()
+        await asyncio.gather(*[asyncio.wrap_future(ready) for ready in self._ready])
+
+    async def infer(self, batch: Sequence[Any]) -> list:
+        """
+        Runs a batch on the next free worker, merged with those of concurrent
+        calls unless micro-batching is off, and returns its results.
+        """
+        batch = list(batch)
+        if not batch:
+            return []
+        if self._stopping:
+            raise InferenceError(f"Inference pool of {self.name} is stopped")
+
+        if self._batcher is not None:
+            return await self._batcher.submit(batch)
+        return await self._infer(batch)
+
+    async def _infer(self, batch: list, retry: bool = True) -> list:
+        self._ensure_started()
+        for attempt in range(2):
+            job = _Job(batch)
+            with self._lock:
+                # Every worker failed to load the model
+                if self._running == 0:
+                    raise InferenceError(f"{self.name} has no inference workers")
+                self._jobs.put(job)
+            try:
+                return await asyncio.wrap_future(job.future)
+            except WorkerCrashed:
+                if attempt or not retry:
+                    raise
+
+    async def stop(self):
+        self._stopping = True
+        for _ in self._threads:
+            self._jobs.put(None)
+
+        loop = asyncio.get_running_loop()
+        for thread in self._threads:
+            await loop.run_in_executor(None, thread.join)
+        self._threads = []
+
+    def _spawn(self, index: int):
+        conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_serve,
+            args=(child_conn, self.module_path, self.factory, self.args, self.threads),
+            name=f"inference-{self.name}-{index}",
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        self._processes[index] = process
+
+        # Wait for the model to load
+        ok, error = conn.recv()
+        if not ok:
+            conn.close()
+            process.join()
+            raise InferenceError(f"{self.name} failed to load its model: {error}")
+        return process, conn
+
+    def _run_worker(self, index: int, ready: Future):
+        try:
+            self._serve_jobs(index, ready)
+        finally:
+            with self._lock:
+                self._running -= 1
+                if self._running == 0:
+                    # No worker is left to take the queued batches
+                    error = InferenceError(f"{self.name} has no inference workers")
+                    self._fail_queued(error)
+
+    def _fail_queued(self, error: Exception):
+        while True:
+            try:
+                job = self._jobs.get_nowait()
+            except queue.Empty:
+                return
+            if job is not None and job.future.set_running_or_notify_cancel():
+                job.future.set_exception(error)
+
+    def _serve_jobs(self, index: int, ready: Future):
+        try:
+            process, conn = self._spawn(index)
+        except Exception as e:
+            ready.set_exception(e)
+            return
+        ready.set_result(None)
+        started = time.monotonic()
+
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            if not job.future.set_running_or_notify_cancel():
+                continue
+
+            self.busy += 1
+            try:
+                conn.send(job.batch)
+                ok, result = conn.recv()
+            except (EOFError, OSError):
+                job.future.set_exception(
+                    WorkerCrashed(f"Inference worker of {self.name} crashed")
+                )
+                process, conn, started = self._restart(index, process, started)
+                if process is None:
+                    return
+                continue
+            except Exception as e:
+                # e.g. a batch or result that cannot be pickled
+                job.future.set_exception(e)
+                continue
+            finally:
+                self.busy -= 1
+
+            if ok:
+                job.future.set_result(result)
+            else:
+                job.future.set_exception(InferenceError(result))
+
+        self._stop_worker(process, conn)
+
+    def _restart(self, index: int, process, started: float):
+        process.join()
+        INFERENCE_RESTARTS.inc((self.name,))
+        logging.warning(
+            f"Inference worker {index} of {self.name} exited with code "
+            f"{process.exitcode}, restarting"
+        )
+
+        while not self._stopping:
+            if time.monotonic() - started < RESTART_DELAY:
+                time.sleep(RESTART_DELAY)
+            started = time.monotonic()
+            try:
+                process, conn = self._spawn(index)
+                return process, conn, started
+            except Exception as e:
+                logging.error(str(e))
+        return None, None, None
+
+    def _stop_worker(self, process, conn):
+        try:
+            conn.send(None)
+        except OSError:
+            pass
+        process.join(STOP_TIMEOUT)
+        if process.is_alive():
+            process.terminate()
+            process.join()
+        conn.close()
+
+    def status(self) -> dict:
+        return {
+            "workers": self.workers,
+            "alive": sum(
+                process.is_alive() for process in list(self._processes.values())
+            ),
+            "busy": self.busy,
+            "queued": self._jobs.qsize(),
+        }
+
+
+# Every pool of this process, for metrics and for resetting them after a fork
+_POOLS: "weakref.WeakSet[InferencePool]" = weakref.WeakSet()
+
+# Pools stopped by suspend_pools(), to be started again by resume_pools()
+_SUSPENDED: List[InferencePool] = []
+
+
+async def suspend_pools():
+    """
+    Stops the workers of every running pool, e.g. before forking, so that
+    their models are not kept loaded by a process that no longer serves.
+    """
+    pools = [pool for pool in list(_POOLS) if pool._threads and not pool._stopping]
+    await asyncio.gather(*[pool.stop() for pool in pools])
+    _SUSPENDED.extend(pools)
+
+
+async def resume_pools():
+    """
+    Starts the workers of the pools stopped by suspend_pools() and waits for
+    them to load their models. A pool that fails is logged, and its infer()
+    calls raise InferenceError.
+    """
+    pools = list(_SUSPENDED)
+    _SUSPENDED.clear()
+    results = await asyncio.gather(
+        *[pool.start() for pool in pools], return_exceptions=True
+    )
+    for pool, result in zip(pools, results):
+        if isinstance(result, Exception):
+            logging.error(f"Failed to start inference workers of {pool.name}: {result}")
+
+
+def _reset_pools():
+    # The worker threads and pipes of the parent's pools do not survive the
+    # fork, and their worker processes belong to the parent
+    for pool in list(_POOLS):
+        pool._reset()
+
+
+os.register_at_fork(after_in_child=_reset_pools)
+
+
+def collect_pools(attribute: str):
+    return [((pool.name,), pool.status()[attribute]) for pool in list(_POOLS)]
+
+
+METRICS.collected(
+    "pipelines_inference_workers_alive",
+    "Inference worker processes running for each pipeline",
+    ("pipeline",),
+    lambda: collect_pools("alive"),
+)
+METRICS.collected(
+    "pipelines_inference_workers_busy",
+    "Inference worker processes running a batch for each pipeline",
+    ("pipeline",),
+    lambda: collect_pools("busy"),
+)
+METRICS.collected(
+    "pipelines_inference_queued_batches",
+    "Batches waiting for a free inference worker of each pipeline",
+    ("pipeline",),
+    lambda: collect_pools("queued"),
+)
@@ -0,0 +1,130 @@
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import asyncio
+import logging
+import time
+import uuid
+
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class ReloadJob:
+    """
+    One reload of the pipelines directory, requested by one or more admin
+    calls (add, upload, delete or reload).
+    """
+
+    def __init__(self, full: bool = False):
+        self.id = uuid.uuid4().hex
+        self.full = full
+        self.state = QUEUED
+        self.stage: Optional[str] = None
+        self.requests: List[str] = []
+        self.modules: Dict[str, dict] = {}
+        self.result: Optional[dict] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.done = asyncio.Event()
+
+    def set_stage(self, stage: str):
+        self.stage = stage
+        logging.info(f"Reload job {self.id}: {stage}")
+
+    def record(self, module_name: str, **timings):
+        """
+        Records per-module timings (e.g. `load`, `startup`) or an `error`.
+        """
+        self.modules.setdefault(module_name, {}).update(timings)
+
+    def status(self) -> dict:
+        return {
+            "id": self.id,
+            "state": self.state,
+            "stage": self.stage,
+            "full": self.full,
+            "requests": self.requests,
+            "modules": self.modules,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "duration": (
+                self.finished_at - self.started_at
+                if self.started_at is not None and self.finished_at is not None
+                else None
+            ),
+        }
+
+
+class ReloadQueue:
+    """
+    Runs reload jobs in the background, one at a time.
+
+    A request made while a job is queued joins that job instead of queueing
+    another one, so a burst of uploads ends in a single reload. A request
+    made while a job is running gets the next job, as the running one may
+    have scanned the directory before the request's change was made.
+    """
+
+    def __init__(self, run: Callable[[ReloadJob], Awaitable[dict]], history: int = 50):
+        self.run = run
+        self.history = history
+        self.jobs: "OrderedDict[str, ReloadJob]" = OrderedDict()
+        self.pending: Optional[ReloadJob] = None
+        self.current: Optional[ReloadJob] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def submit(self, request: str, full: bool = False) -> ReloadJob:
+        job = self.pending
+        if job is None:
+            job = self.pending = ReloadJob()
+            self.jobs[job.id] = job
+            while len(self.jobs) > self.history:
+                self.jobs.popitem(last=False)
+
+        job.full = job.full or full
+        job.requests.append(request)
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return job
+
+    def get(self, job_id: str) -> Optional[ReloadJob]:
+        return self.jobs.get(job_id)
+
+    async def _run(self):
+        while self.pending is not None:
+            job = self.current = self.pending
+            self.pending = None
+
+            job.state = RUNNING
+            job.started_at = time.time()
+            try:
+                job.result = await self.run(job)
+                job.state = SUCCEEDED
+            except Exception as e:
+                job.error = str(e) or e.__class__.__name__
+                job.state = FAILED
+                logging.error(f"Reload job {job.id} failed: {job.error}")
+            finally:
+                job.finished_at = time.time()
+                job.stage = None
+                job.done.set()
+                self.current = None
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,137 @@
+from collections import Counter
+from typing import Callable, Optional, Tuple
+
+from utils.pipelines.metrics import METRICS
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+
+
+LOOP_LAG = METRICS.histogram(
+    "pipelines_event_loop_lag_seconds",
+    "Scheduling delay of the event loop heartbeat",
+)
+LOOP_STALLS = METRICS.counter(
+    "pipelines_event_loop_stalls_total",
+    "Times the event loop was blocked, by the pipeline that was running",
+    ("pipeline",),
+)
+LOOP_STALL_SECONDS = METRICS.counter(
+    "pipelines_event_loop_stall_seconds_total",
+    "Time the event loop was blocked, by the pipeline that was running",
+    ("pipeline",),
+)
+
+
+class LoopLagMonitor:
+    """
+    Finds code that blocks the event loop.
+
+    A heartbeat task on the loop measures its own scheduling delay. A
+    watchdog thread notices when the heartbeat stops for longer than
+    `threshold` seconds, samples the loop thread's stack while it is stuck,
+    and attributes the stall to the innermost frame in a pipeline file, which
+    `resolve` maps from a filename to a pipeline id. `on_stall` is then called
+    from the watchdog thread with the pipeline id and the stall duration.
+    """
+
+    def __init__(
+        self,
+        interval: float,
+        threshold: float,
+        resolve: Callable[[str], Optional[str]],
+        on_stall: Optional[Callable[[str, float], None]] = None,
+    ):
+        self.interval = interval
+        self.threshold = threshold
+        self.resolve = resolve
+        self.on_stall = on_stall
+
+        self._last_beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self.threshold <= 0 or self._task is not None:
+            return
+
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(
+            target=self._watch, name="pipelines-loop-watchdog", daemon=True
+        )
+        self._thread.start()
+
+    async def stop(self):
+        if self._task is None:
+            return
+
+        self._stop.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._thread = None
+
+    async def _heartbeat(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start_time = loop.time()
+            await asyncio.sleep(self.interval)
+            LOOP_LAG.observe(max(0.0, loop.time() - start_time - self.interval))
+            self._last_beat = time.monotonic()
+
+    def _watch(self):
+        stall_beat = None
+        culprits = Counter()
+
+        while not self._stop.wait(self.interval):
+            last_beat = self._last_beat
+
+            if time.monotonic() - last_beat > self.interval + self.threshold:
+                # Still blocked: sample the stack again, the most frequent
+                # culprit is reported once the loop recovers
+                stall_beat = last_beat
+                culprits[self.sample()] += 1
+            elif stall_beat is not None and last_beat != stall_beat:
+                duration = last_beat - stall_beat - self.interval
+                self.report(culprits.most_common(1)[0][0], duration)
+                stall_beat = None
+                culprits.clear()
+
+    def sample(self) -> Tuple[str, str]:
+        """
+        Returns the pipeline id and code location the loop thread is running.
+        """
+        frame = sys._current_frames().get(self._loop_thread_id)
+        innermost = None
+        while frame is not None:
+            location = (
+                f"{frame.f_code.co_filename}:{frame.f_lineno} "
+                f"in {frame.f_code.co_name}"
+            )
+            innermost = innermost or location
+            pipeline_id = self.resolve(frame.f_code.co_filename)
+            if pipeline_id is not None:
+                return pipeline_id, location
+            frame = frame.f_back
+        return "unknown", innermost or "unknown"
+
+    def report(self, culprit: Tuple[str, str], duration: float):
+        pipeline_id, location = culprit
+        LOOP_STALLS.inc((pipeline_id,))
+        LOOP_STALL_SECONDS.inc((pipeline_id,), duration)
+        logging.warning(
+            f"Event loop blocked for {duration:.3f}s by {pipeline_id} at {location}"
+        )
+        if self.on_stall is not None:
+            self.on_stall(pipeline_id, duration)
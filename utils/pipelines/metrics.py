@@ -0,0 +1,268 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from utils.pipelines.tracing import trace_inference
+
+import threading
+import time
+
+
+# Latency buckets in seconds, from sub-millisecond filters to slow model calls
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [
+        f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _ShardedMetric:
+    """
+    Base for metrics that are written on the hot path.
+
+    Each thread records into its own shard, so recording never takes a lock
+    and never contends with other threads; the shards are only merged when
+    the metrics are collected.
+    """
+
+    type = ""
+
+    def __init__(self, name: str, help: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self._local = threading.local()
+        self._shards: List[dict] = []
+        self._shards_lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+            return shard
+
+    def _items(self) -> Iterable[Tuple[tuple, object]]:
+        with self._shards_lock:
+            shards = list(self._shards)
+        for shard in shards:
+            yield from list(shard.items())
+
+
+class Counter(_ShardedMetric):
+    type = "counter"
+
+    def inc(self, labels: tuple = (), amount: float = 1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def values(self) -> Dict[tuple, float]:
+        merged = {}
+        for labels, value in self._items():
+            merged[labels] = merged.get(labels, 0) + value
+        return merged
+
+    def render(self) -> List[str]:
+        return [
+            f"{self.name}{_labels(self.label_names, labels)} {value}"
+            for labels, value in self.values().items()
+        ]
+
+
+class Histogram(_ShardedMetric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help, label_names)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, labels: tuple = ()):
+        shard = self._shard()
+        data = shard.get(labels)
+        if data is None:
+            # One count per bucket, one for +Inf, then the sum
+            data = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        data[bisect_left(self.buckets, value)] += 1
+        data[-1] += value
+
+    @contextmanager
+    def time(self, labels: tuple = ()):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start_time, labels)
+
+    def values(self) -> Dict[tuple, list]:
+        merged = {}
+        for labels, data in self._items():
+            total = merged.get(labels)
+            if total is None:
+                merged[labels] = list(data)
+            else:
+                merged[labels] = [a + b for a, b in zip(total, data)]
+        return merged
+
+    def render(self) -> List[str]:
+        lines = []
+        for labels, data in self.values().items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), data):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                label_str = _labels(self.label_names, labels, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{label_str} {cumulative}")
+            label_str = _labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{label_str} {data[-1]}")
+            lines.append(f"{self.name}_count{label_str} {cumulative}")
+        return lines
+
+
+class Collected:
+    """
+    A gauge or counter whose values are read from existing state when the
+    metrics are collected, so nothing is recorded on the hot path.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        label_names: Sequence[str],
+        collect: Callable[[], Iterable[Tuple[tuple, float]]],
+        type: str = "gauge",
+    ):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self.collect = collect
+        self.type = type
+
+    def render(self) -> List[str]:
+        return [
+            f"{self.name}{_labels(self.label_names, labels)} {value}"
+            for labels, value in self.collect()
+        ]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, label_names: Sequence[str] = ()):
+        return self.register(Counter(name, help, label_names))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        return self.register(Histogram(name, help, label_names, buckets))
+
+    def collected(self, name: str, help: str, label_names, collect, type="gauge"):
+        return self.register(Collected(name, help, label_names, collect, type))
+
+    def render(self) -> str:
+        """
+        Renders every metric in the Prometheus text exposition format.
+        """
+        lines = []
+        for metric in list(self.metrics.values()):
+            try:
+                samples = metric.render()
+            except Exception as e:
+                lines.append(f"# {metric.name} failed to collect: {e}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
+
+HOOK_DURATION = METRICS.histogram(
+    "pipelines_hook_duration_seconds",
+    "Time spent in a pipeline's inlet, outlet or pipe",
+    ("pipeline", "hook"),
+)
+INFERENCE_DURATION = METRICS.histogram(
+    "pipelines_inference_duration_seconds",
+    "Time spent in model inference inside a pipeline",
+    ("pipeline", "model"),
+)
+FILTER_REJECTIONS = METRICS.counter(
+    "pipelines_filter_rejections_total",
+    "Requests rejected by each filter in perform_filters",
+    ("pipeline",),
+)
+STREAM_CHUNKS = METRICS.counter(
+    "pipelines_stream_chunks_total",
+    "Chunks pulled from streaming pipes",
+    ("pipeline",),
+)
+STREAM_FIRST_CHUNK = METRICS.histogram(
+    "pipelines_stream_first_chunk_seconds",
+    "Time from the start of a stream to its first chunk",
+    ("pipeline",),
+)
+
+
+@contextmanager
+def track_inference(
+    pipeline_id: str, model: str = "default", text: Optional[str] = None
+):
+    """
+    Records the duration of a model call and traces it, e.g.
+
+        with track_inference(__name__, "nsfw", text):
+            results = self.nsfw_model(text)
+    """
+    start_time = time.perf_counter()
+    try:
+        with trace_inference(pipeline_id, model, text):
+            yield
+    finally:
+        INFERENCE_DURATION.observe(
+            time.perf_counter() - start_time, (pipeline_id, model)
+        )
@@ -0,0 +1,57 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import asyncio
+import contextvars
+import inspect
+import threading
+
+
+_local = threading.local()
+
+
+def _run_hook(hook, args, kwargs):
+    result = hook(*args, **kwargs)
+    if not inspect.isawaitable(result):
+        return result
+
+    # Each worker thread keeps one event loop for the async hooks it runs
+    loop = getattr(_local, "loop", None)
+    if loop is None:
+        loop = _local.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+    return loop.run_until_complete(result)
+
+
+class HookExecutor:
+    """
+    Runs pipeline hooks that block (e.g. model inference inside an
+    `async def inlet`) on a dedicated pool of threads, so they neither stall
+    the event loop nor serialize each other on it.
+
+    Sync hooks always run here. Async hooks run on an event loop owned by
+    the worker thread, so they must not use loop-bound resources created on
+    the main loop, which is why pipelines can opt out with `blocking = False`.
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="pipelines-hooks"
+        )
+        self.active = 0
+
+    async def run(self, hook, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        # Carry contextvars (Server-Timing, tracing) into the worker thread
+        context = contextvars.copy_context()
+
+        self.active += 1
+        try:
+            return await loop.run_in_executor(
+                self.executor, context.run, _run_hook, hook, args, kwargs
+            )
+        finally:
+            self.active -= 1
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
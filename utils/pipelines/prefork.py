@@ -0,0 +1,148 @@
+from typing import Dict
+
+import argparse
+import asyncio
+import gc
+import importlib
+import logging
+import os
+import signal
+import sys
+import time
+import traceback
+
+import uvicorn
+
+
+# A worker that dies sooner than this after being forked is restarted only
+# after this delay, so a crashing worker does not fork in a tight loop
+RESTART_DELAY = 1.0
+
+# Logs next to uvicorn's own server messages
+logger = logging.getLogger("uvicorn.error")
+
+
+class PreforkServer:
+    """
+    Serves an app from `workers` forked processes that share one listening
+    socket.
+
+    The app must be fully loaded before run() is called. Everything loaded
+    by then, such as model weights, is shared copy-on-write by the workers
+    instead of being loaded again by each of them. To keep those pages
+    shared, the garbage collector is frozen before forking: collections in
+    the workers then never write to the objects inherited from the parent.
+
+    The parent only supervises: it restarts workers that die and forwards
+    SIGINT and SIGTERM to them.
+    """
+
+    def __init__(self, config: uvicorn.Config, workers: int):
+        self.config = config
+        self.workers = workers
+        self.socket = None
+        self.pids: Dict[int, float] = {}
+        self.stopping = False
+
+    def run(self):
+        self.socket = self.config.bind_socket()
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+
+        # Move everything loaded so far out of the collector's reach
+        gc.freeze()
+
+        for _ in range(self.workers):
+            self.spawn()
+        self.supervise()
+        logger.info("Stopped all workers")
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self.run_worker()
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+
+        self.pids[pid] = time.monotonic()
+        logger.info(f"Forked worker [{pid}]")
+
+    def run_worker(self):
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        gc.enable()
+        uvicorn.Server(self.config).run(sockets=[self.socket])
+
+    def supervise(self):
+        while self.pids:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+
+            started = self.pids.pop(pid, None)
+            if started is None or self.stopping:
+                continue
+
+            code = os.waitstatus_to_exitcode(status)
+            logger.warning(f"Worker [{pid}] exited with code {code}, restarting")
+            if time.monotonic() - started < RESTART_DELAY:
+                time.sleep(RESTART_DELAY)
+            if not self.stopping:
+                self.spawn()
+
+    def stop(self, signum, frame):
+        # A second signal kills the workers that are still shutting down
+        kill = signal.SIGKILL if self.stopping else signal.SIGTERM
+        self.stopping = True
+        for pid in list(self.pids):
+            try:
+                os.kill(pid, kill)
+            except ProcessLookupError:
+                pass
+
+
+def serve(args):
+    # Collections in the parent would leave freed holes in the pages the
+    # workers share, so the collector stays off until they are forked
+    gc.disable()
+
+    start_time = time.perf_counter()
+    config = uvicorn.Config(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        forwarded_allow_ips=args.forwarded_allow_ips,
+        timeout_keep_alive=args.timeout_keep_alive,
+        log_level=args.log_level,
+    )
+
+    server = importlib.import_module("main")
+    asyncio.run(server.preload())
+    logger.info(
+        f"Preloaded {len(server.PIPELINE_MODULES)} pipelines in "
+        f"{time.perf_counter() - start_time:.2f}s, forking {args.workers} workers"
+    )
+
+    PreforkServer(config, args.workers).run()
+
+
+if __name__ == "__main__":
+    # Usage: python -m utils.pipelines.prefork --workers 4 [--host H] [--port P]
+    from config import WORKERS
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=9099)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--forwarded-allow-ips", default="*")
+    parser.add_argument("--timeout-keep-alive", type=int, default=75)
+    parser.add_argument("--log-level", default="info")
+    serve(parser.parse_args())
@@ -0,0 +1,117 @@
+from typing import Awaitable, Callable, Dict, Optional
+
+import asyncio
+import logging
+import time
+
+
+COLD = "cold"
+WARMING = "warming"
+READY = "ready"
+FAILED = "failed"
+
+
+class PipelineNotReady(Exception):
+    def __init__(self, pipeline_id: str, state: str, error: Optional[str] = None):
+        self.pipeline_id = pipeline_id
+        self.state = state
+        self.error = error
+        detail = f"Pipeline {pipeline_id} is {state}"
+        super().__init__(f"{detail}: {error}" if error else detail)
+
+
+class PipelineReadiness:
+    def __init__(self, state: str = COLD):
+        self.state = state
+        self.error: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+        self.warmup_time: Optional[float] = None
+
+
+class ReadinessTracker:
+    """
+    Tracks whether each pipeline has finished its on_startup.
+
+    Eagerly started pipelines are marked ready by the loader. Lazy pipelines
+    start cold and are warmed by `warm()`, either from a background task or
+    on their first request, which waits on the same warm-up task.
+    """
+
+    def __init__(self, start: Callable[[str], Awaitable[None]]):
+        self.start = start
+        self.pipelines: Dict[str, PipelineReadiness] = {}
+
+    def mark(self, pipeline_id: str, state: str, error: Optional[str] = None):
+        readiness = self.pipelines.setdefault(pipeline_id, PipelineReadiness())
+        readiness.state = state
+        readiness.error = error
+
+    def forget(self, pipeline_id: str):
+        readiness = self.pipelines.pop(pipeline_id, None)
+        if readiness and readiness.task and not readiness.task.done():
+            readiness.task.cancel()
+
+    def state(self, pipeline_id: str) -> str:
+        readiness = self.pipelines.get(pipeline_id)
+        return readiness.state if readiness else READY
+
+    def is_ready(self, pipeline_id: str) -> bool:
+        return self.state(pipeline_id) == READY
+
+    def warm(self, pipeline_id: str) -> Optional[asyncio.Task]:
+        """
+        Starts warming a cold pipeline and returns its warm-up task.
+        """
+        readiness = self.pipelines.get(pipeline_id)
+        if readiness is None or readiness.state in (READY, FAILED):
+            return None
+
+        if readiness.task is None:
+            readiness.state = WARMING
+            readiness.task = asyncio.create_task(self._warm(pipeline_id, readiness))
+
+        return readiness.task
+
+    async def _warm(self, pipeline_id: str, readiness: PipelineReadiness):
+        start_time = time.perf_counter()
+        try:
+            await self.start(pipeline_id)
+        except Exception as e:
+            readiness.state = FAILED
+            readiness.error = str(e)
+            logging.error(f"Error warming pipeline {pipeline_id}: {e}")
+        else:
+            readiness.state = READY
+            logging.info(f"Warmed pipeline {pipeline_id}")
+        finally:
+            readiness.warmup_time = time.perf_counter() - start_time
+
+    async def wait_ready(self, pipeline_id: str, timeout: float):
+        """
+        Waits up to `timeout` seconds for a pipeline to become ready, warming
+        it if needed. Raises PipelineNotReady if it does not; a timeout of 0
+        fails fast without waiting.
+        """
+        if self.is_ready(pipeline_id):
+            return
+
+        task = self.warm(pipeline_id)
+        if task is not None and timeout > 0:
+            try:
+                await asyncio.wait_for(asyncio.shield(task), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+        readiness = self.pipelines.get(pipeline_id)
+        if readiness is not None and readiness.state != READY:
+            raise PipelineNotReady(pipeline_id, readiness.state, readiness.error)
+
+    def status(self) -> Dict[str, dict]:
+        return {
+            pipeline_id: {
+                "state": readiness.state,
+                "error": readiness.error,
+                "warmup_time": readiness.warmup_time,
+            }
+            for pipeline_id, readiness in self.pipelines.items()
+        }
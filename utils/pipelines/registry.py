@@ -0,0 +1,114 @@
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, Mapping
+
+import asyncio
+import hashlib
+import json
+import time
+
+
+@dataclass(frozen=True)
+class RegistrySnapshot:
+    """
+    Immutable view of the pipelines served by the app.
+
+    A snapshot is built once from the loaded modules and replaced as a whole
+    whenever the modules or their valves change, so request handlers only
+    ever read it.
+    """
+
+    version: int
+    pipelines: Mapping[str, dict]
+    created: int
+    models_body: bytes
+    etag: str
+
+
+def build_snapshot(version: int, pipelines: dict, render_models) -> RegistrySnapshot:
+    """
+    Freezes `pipelines` into a new snapshot.
+
+    `render_models(pipelines, created)` returns the `/models` payload, which is
+    serialized once here so the endpoint can serve it without rebuilding it.
+    """
+    created = int(time.time())
+    models_body = json.dumps(render_models(pipelines, created)).encode("utf-8")
+    etag = f'"{hashlib.sha1(models_body).hexdigest()}"'
+
+    return RegistrySnapshot(
+        version=version,
+        pipelines=MappingProxyType(dict(pipelines)),
+        created=created,
+        models_body=models_body,
+        etag=etag,
+    )
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Evaluates an If-None-Match header against `etag` (weak comparison).
+    """
+    if not if_none_match:
+        return False
+
+    if if_none_match.strip() == "*":
+        return True
+
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+
+    return False
+
+
+class InFlight:
+    """
+    Counts the requests using each pipeline instance.
+
+    A reload swaps new instances into the registry while requests are still
+    running on the old ones; those are only shut down once drained.
+    """
+
+    def __init__(self):
+        self._counts: Dict[int, int] = {}
+        self._drained: Dict[int, asyncio.Event] = {}
+
+    def acquire(self, instance):
+        key = id(instance)
+        self._counts[key] = self._counts.get(key, 0) + 1
+
+    def release(self, instance):
+        key = id(instance)
+        count = self._counts[key] - 1
+        if count:
+            self._counts[key] = count
+            return
+
+        del self._counts[key]
+        drained = self._drained.pop(key, None)
+        if drained is not None:
+            drained.set()
+
+    def count(self, instance) -> int:
+        return self._counts.get(id(instance), 0)
+
+    async def drain(self, instance, timeout: float) -> bool:
+        """
+        Waits up to `timeout` seconds for the requests using `instance` to
+        finish. Returns False if some are still running.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+
+        # A request may pick the instance up again before this task resumes
+        while self.count(instance):
+            drained = self._drained.setdefault(id(instance), asyncio.Event())
+            try:
+                await asyncio.wait_for(drained.wait(), deadline - loop.time())
+            except asyncio.TimeoutError:
+                return False
+        return True
@@ -0,0 +1,149 @@
+from typing import Iterable, List, Optional
+
+import hashlib
+import importlib.metadata
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import sys
+
+try:
+    from packaging.requirements import InvalidRequirement, Requirement
+except ImportError:
+    Requirement = None
+
+
+# Installed requirement sets are stamped inside the environment they were
+# installed into, so a fresh environment (e.g. a new container) starts clean.
+STAMP_PATH = os.path.join(sys.prefix, ".pipelines-requirements.json")
+
+
+def parse_frontmatter(content):
+    frontmatter = {}
+    for line in content.split("\n"):
+        if ":" in line:
+            key, value = line.split(":", 1)
+            frontmatter[key.strip().lower()] = value.strip()
+    return frontmatter
+
+
+def read_frontmatter(module_path) -> dict:
+    with open(module_path, "r") as file:
+        content = file.read()
+
+    if content.startswith('"""'):
+        end = content.find('"""', 3)
+        if end != -1:
+            return parse_frontmatter(content[3:end])
+    return {}
+
+
+def parse_requirements(requirements: Optional[str]) -> List[str]:
+    if not requirements:
+        return []
+    return [req.strip() for req in requirements.split(",") if req.strip()]
+
+
+def is_satisfied(requirement: str) -> bool:
+    """
+    Checks whether an installed distribution already satisfies `requirement`.
+    """
+    if Requirement is None:
+        # Without packaging only bare names can be checked
+        name = re.split(r"[\s<>=!~;\[@]", requirement, maxsplit=1)[0]
+        if name != requirement:
+            return False
+        try:
+            importlib.metadata.version(name)
+            return True
+        except importlib.metadata.PackageNotFoundError:
+            return False
+
+    try:
+        req = Requirement(requirement)
+    except InvalidRequirement:
+        return False
+
+    if req.marker is not None and not req.marker.evaluate():
+        return True
+    if req.url:
+        return False
+
+    try:
+        version = importlib.metadata.version(req.name)
+    except importlib.metadata.PackageNotFoundError:
+        return False
+
+    return req.specifier.contains(version, prereleases=True)
+
+
+def requirements_hash(requirements: Iterable[str]) -> str:
+    return hashlib.sha256(
+        "\n".join(sorted(set(requirements))).encode("utf-8")
+    ).hexdigest()
+
+
+def load_stamps() -> dict:
+    try:
+        with open(STAMP_PATH, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_stamps(new_stamps: Iterable[str]) -> None:
+    stamps = load_stamps()
+    stamps.update({stamp: True for stamp in new_stamps})
+    try:
+        with open(STAMP_PATH, "w") as f:
+            json.dump(stamps, f)
+    except OSError as e:
+        logging.warning(f"Could not record requirements stamps: {e}")
+
+
+def install_command(requirements: List[str]) -> List[str]:
+    if shutil.which("uv"):
+        return ["uv", "pip", "install", "--python", sys.executable, *requirements]
+    return [sys.executable, "-m", "pip", "install", *requirements]
+
+
+def install_requirements(requirement_sets: Iterable[List[str]]) -> List[str]:
+    """
+    Installs the requirements of several pipelines at once.
+
+    Sets that were installed before (by content hash) are skipped entirely.
+    Of the rest, only the requirements that are not already satisfied are
+    installed, in a single pip (or uv) invocation. Returns those.
+    """
+    stamps = load_stamps()
+    pending = {}
+    for requirements in requirement_sets:
+        if requirements:
+            stamp = requirements_hash(requirements)
+            if stamp not in stamps:
+                pending[stamp] = requirements
+
+    requirements = sorted({req for reqs in pending.values() for req in reqs})
+    missing = [req for req in requirements if not is_satisfied(req)]
+    if missing:
+        print(f"Installing requirements: {', '.join(missing)}")
+        subprocess.check_call(install_command(missing))
+        importlib.invalidate_caches()
+
+    if pending:
+        save_stamps(pending.keys())
+    return missing
+
+
+if __name__ == "__main__":
+    # Usage: python -m utils.pipelines.requirements <pipeline.py>...
+    install_requirements(
+        [
+            parse_requirements(read_frontmatter(module_path).get("requirements"))
+            for module_path in sys.argv[1:]
+            if os.path.isfile(module_path) and module_path.endswith(".py")
+        ]
+    )
@@ -0,0 +1,148 @@
+from json.encoder import encode_basestring_ascii
+from typing import Any, AsyncIterator, Callable, List, Optional
+
+import asyncio
+import json
+import time
+import uuid
+
+
+# Stand-in for the delta text while rendering the constant parts of a chunk
+_PLACEHOLDER = "\x00"
+
+
+class ChunkEncoder:
+    """
+    Encodes the deltas of one streamed completion as SSE
+    `chat.completion.chunk` events.
+
+    Every chunk of a stream shares one id and timestamp, so the JSON around
+    the delta text is rendered once and each delta only costs escaping its
+    text. The output is byte-for-byte what `json.dumps` would produce.
+    """
+
+    def __init__(self, model: str):
+        self.id = f"{model}-{str(uuid.uuid4())}"
+        self.created = int(time.time())
+        self.model = model
+
+        template = json.dumps(self.chunk({"content": _PLACEHOLDER}, None))
+        prefix, suffix = template.split(json.dumps(_PLACEHOLDER))
+        self._prefix = f"data: {prefix}".encode("utf-8")
+        self._suffix = f"{suffix}\n\n".encode("utf-8")
+
+        self._finish = (
+            f"data: {json.dumps(self.chunk({}, 'stop'))}\n\ndata: [DONE]".encode(
+                "utf-8"
+            )
+        )
+
+    def chunk(self, delta: dict, finish_reason) -> dict:
+        return {
+            "id": self.id,
+            "object": "chat.completion.chunk",
+            "created": self.created,
+            "model": self.model,
+            "choices": [
+                {
+                    "index": 0,
+                    "delta": delta,
+                    "logprobs": None,
+                    "finish_reason": finish_reason,
+                }
+            ],
+        }
+
+    def delta(self, text: str) -> bytes:
+        return b"".join(
+            (self._prefix, encode_basestring_ascii(text).encode("ascii"), self._suffix)
+        )
+
+    def event(self, line: str) -> bytes:
+        """
+        Passes through a line that is already an SSE `data:` field.
+        """
+        return f"{line}\n\n".encode("utf-8")
+
+    def finish(self) -> bytes:
+        """
+        Returns the final `finish_reason: stop` chunk followed by [DONE].
+        """
+        return self._finish
+
+
+async def coalesce_deltas(
+    lines: AsyncIterator,
+    encode_line: Callable[[Any], bytes],
+    encode_delta: Callable[[str], bytes],
+    max_bytes: int,
+    interval: float,
+) -> AsyncIterator[bytes]:
+    """
+    Merges consecutive text deltas of a stream into fewer SSE events.
+
+    The first delta is sent as soon as it arrives so time-to-first-token is
+    unchanged. Later deltas are buffered until `max_bytes` have accumulated or
+    `interval` seconds have passed since the first buffered one, whichever
+    comes first, even if the upstream is idle. Anything that is not a plain
+    text delta flushes the buffer and is passed to `encode_line` as is.
+    """
+    loop = asyncio.get_running_loop()
+    iterator = lines.__aiter__()
+
+    buffer: List[str] = []
+    buffered_bytes = 0
+    deadline = 0.0
+    first = True
+    pending: Optional[asyncio.Future] = None
+
+    def flush() -> bytes:
+        nonlocal buffered_bytes
+        text = "".join(buffer)
+        buffer.clear()
+        buffered_bytes = 0
+        return encode_delta(text)
+
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+
+            timeout = max(0.0, deadline - loop.time()) if buffer else None
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+            if not done:
+                yield flush()
+                continue
+
+            future, pending = pending, None
+            try:
+                line = future.result()
+            except StopAsyncIteration:
+                break
+
+            if isinstance(line, bytes):
+                line = line.decode("utf-8")
+
+            if not isinstance(line, str) or line.startswith("data:"):
+                if buffer:
+                    yield flush()
+                yield encode_line(line)
+                continue
+
+            if first:
+                first = False
+                yield encode_delta(line)
+                continue
+
+            if not buffer:
+                deadline = loop.time() + interval
+            buffer.append(line)
+            buffered_bytes += len(line.encode("utf-8"))
+            if buffered_bytes >= max_bytes:
+                yield flush()
+
+        if buffer:
+            yield flush()
+    finally:
+        if pending is not None:
+            pending.cancel()
@@ -0,0 +1,118 @@
+from typing import Dict, Optional
+
+import anyio
+import logging
+import time
+
+
+def _close_sync(iterator, deadline: float):
+    close = getattr(iterator, "close", None)
+    if close is None:
+        return
+
+    while True:
+        try:
+            close()
+            return
+        except ValueError:
+            # A pull of the next chunk is still running in another thread; the
+            # generator can only be closed once it returns
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(0.01)
+
+
+async def _close_async(iterator):
+    while True:
+        try:
+            await iterator.aclose()
+            return
+        except RuntimeError:
+            # A cancelled pull of the next chunk has not unwound yet
+            await anyio.sleep(0.01)
+
+
+async def close_upstream(result, timeout: float) -> bool:
+    """
+    Closes the generator or iterator a pipe returned, so the pipe can stop its
+    upstream request and release the connection. Waits at most `timeout`
+    seconds, even if the calling task is being cancelled. Returns whether the
+    upstream was closed in time.
+    """
+    with anyio.move_on_after(timeout, shield=True) as scope:
+        try:
+            if hasattr(result, "aclose"):
+                await _close_async(result)
+            elif hasattr(result, "close"):
+                await anyio.to_thread.run_sync(
+                    _close_sync, result, time.monotonic() + timeout
+                )
+        except Exception as e:
+            logging.warning(f"Error closing upstream stream: {e}")
+            return False
+
+    if scope.cancelled_caught:
+        logging.warning(f"Upstream stream did not close within {timeout}s")
+        return False
+    return True
+
+
+class StreamStats:
+    def __init__(self):
+        self.completed = 0
+        self.aborted = 0
+        self.chunks = 0
+        self.tokens_saved = 0
+
+    def expected_chunks(self, max_tokens: Optional[int]) -> Optional[float]:
+        if isinstance(max_tokens, int) and max_tokens > 0:
+            return max_tokens
+        if self.completed:
+            return self.chunks / self.completed
+        return None
+
+
+class StreamTracker:
+    """
+    Counts completed and aborted streams per pipeline.
+
+    When a client disconnects mid-stream, the tokens saved by closing the
+    upstream are estimated as the request's `max_tokens`, or otherwise the
+    average length of the pipeline's completed streams, minus the chunks that
+    were already generated (one chunk is counted as one token).
+    """
+
+    def __init__(self):
+        self.pipelines: Dict[str, StreamStats] = {}
+
+    def _stats(self, pipeline_id: str) -> StreamStats:
+        stats = self.pipelines.get(pipeline_id)
+        if stats is None:
+            stats = self.pipelines[pipeline_id] = StreamStats()
+        return stats
+
+    def record_completed(self, pipeline_id: str, chunks: int):
+        stats = self._stats(pipeline_id)
+        stats.completed += 1
+        stats.chunks += chunks
+
+    def record_aborted(
+        self, pipeline_id: str, chunks: int, max_tokens: Optional[int] = None
+    ) -> int:
+        stats = self._stats(pipeline_id)
+        expected = stats.expected_chunks(max_tokens)
+        saved = max(0, int(expected - chunks)) if expected is not None else 0
+
+        stats.aborted += 1
+        stats.tokens_saved += saved
+        return saved
+
+    def status(self) -> Dict[str, dict]:
+        return {
+            pipeline_id: {
+                "completed": stats.completed,
+                "aborted": stats.aborted,
+                "tokens_saved": stats.tokens_saved,
+            }
+            for pipeline_id, stats in self.pipelines.items()
+        }
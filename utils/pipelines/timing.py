@@ -0,0 +1,115 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+
+from starlette.datastructures import MutableHeaders
+
+import logging
+import time
+
+
+class ServerTiming:
+    """
+    Monotonic nanosecond timings of the stages of one request, rendered as a
+    `Server-Timing` header (durations in milliseconds).
+    """
+
+    def __init__(self):
+        self.start_ns = time.perf_counter_ns()
+        self.stages: List[Tuple[str, int, Optional[str]]] = []
+
+    def add(self, name: str, duration_ns: int, desc: Optional[str] = None):
+        self.stages.append((name, duration_ns, desc))
+
+    def elapsed_ns(self) -> int:
+        return time.perf_counter_ns() - self.start_ns
+
+    def header(self, total_ns: Optional[int] = None) -> str:
+        stages = list(self.stages)
+        if total_ns is not None:
+            stages.append(("total", total_ns, None))
+
+        metrics = []
+        for name, duration_ns, desc in stages:
+            metric = f"{name};dur={duration_ns / 1e6:.3f}"
+            if desc:
+                desc = desc.replace("\\", "\\\\").replace('"', '\\"')
+                metric += f';desc="{desc}"'
+            metrics.append(metric)
+        return ", ".join(metrics)
+
+    def __str__(self) -> str:
+        return " ".join(
+            f"{name}={duration_ns / 1e6:.3f}ms" for name, duration_ns, _ in self.stages
+        )
+
+
+_current: ContextVar[Optional[ServerTiming]] = ContextVar(
+    "server_timing", default=None
+)
+
+
+def current_timing() -> Optional[ServerTiming]:
+    return _current.get()
+
+
+def record(name: str, duration_ns: int, desc: Optional[str] = None):
+    timing = _current.get()
+    if timing is not None:
+        timing.add(name, duration_ns, desc)
+
+
+def mark(name: str, desc: Optional[str] = None):
+    """
+    Records the time from the start of the request until now as a stage.
+    """
+    timing = _current.get()
+    if timing is not None:
+        timing.add(name, timing.elapsed_ns(), desc)
+
+
+@contextmanager
+def timed(name: str, desc: Optional[str] = None):
+    start_ns = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter_ns() - start_ns, desc)
+
+
+class ServerTimingMiddleware:
+    """
+    Times every HTTP request and adds `Server-Timing` and `X-Process-Time`
+    (seconds) headers, then logs the stages.
+
+    Stages recorded after the headers were sent, such as those of a streamed
+    body, only appear in the log. This is plain ASGI middleware rather than
+    `@app.middleware("http")`, which does not pass client disconnects on to
+    streaming responses, so their pipes would keep running.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timing = ServerTiming()
+        token = _current.set(timing)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                total_ns = timing.elapsed_ns()
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", timing.header(total_ns))
+                headers.append("X-Process-Time", f"{total_ns / 1e9:.6f}")
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            timing.add("total", timing.elapsed_ns())
+            logging.info(f"{scope['method']} {scope['path']} {timing}")
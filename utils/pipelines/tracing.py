@@ -0,0 +1,144 @@
+from contextlib import contextmanager
+from typing import Optional
+
+from ddtrace import tracer
+
+import random
+
+
+# Fraction of traces that get pipeline spans, see configure()
+SAMPLE_RATE = 1.0
+
+# Same hashing of trace ids as ddtrace's rate sampler
+_KNUTH_FACTOR = 1111111111111111111
+_MAX_TRACE_ID = 2**64
+
+
+def configure(sample_rate: float):
+    global SAMPLE_RATE
+    SAMPLE_RATE = sample_rate
+
+
+def sampled() -> bool:
+    """
+    Decides whether to create pipeline spans. The decision is made once per
+    trace, so a sampled request gets the spans of all of its filters.
+    """
+    if not tracer.enabled or SAMPLE_RATE <= 0:
+        return False
+    if SAMPLE_RATE >= 1:
+        return True
+
+    root = tracer.current_root_span()
+    if root is None:
+        return random.random() < SAMPLE_RATE
+    return (root.trace_id * _KNUTH_FACTOR) % _MAX_TRACE_ID < (
+        SAMPLE_RATE * _MAX_TRACE_ID
+    )
+
+
+def input_length(body) -> Optional[int]:
+    """
+    Length of the text a hook works on: `text` for perform_filters, otherwise
+    the content of the last message.
+    """
+    if isinstance(body, str):
+        return len(body)
+    if not isinstance(body, dict):
+        return None
+    if isinstance(body.get("text"), str):
+        return len(body["text"])
+
+    messages = body.get("messages")
+    if messages and isinstance(messages[-1], dict):
+        content = messages[-1].get("content")
+        if isinstance(content, str):
+            return len(content)
+    return None
+
+
+@contextmanager
+def trace_hook(
+    pipeline_id: str,
+    hook: str,
+    body=None,
+    verdict: bool = False,
+    cache: Optional[str] = None,
+):
+    """
+    Wraps a pipeline hook in a `pipelines.<hook>` span.
+
+    With `verdict`, an exception means the filter rejected the input: the
+    span is tagged `verdict:rejected` instead of being marked as an error.
+    `cache` tags the span with the verdict cache outcome, e.g. "miss".
+    """
+    if not sampled():
+        yield None
+        return
+
+    span = tracer.trace(f"pipelines.{hook}", resource=pipeline_id)
+    span.set_tag("pipeline.id", pipeline_id)
+    span.set_tag("pipeline.hook", hook)
+    if cache is not None:
+        span.set_tag("cache", cache)
+    length = input_length(body)
+    if length is not None:
+        span.set_metric("input.length", length)
+
+    try:
+        yield span
+    except BaseException as e:
+        if verdict and isinstance(e, Exception):
+            span.set_tag("verdict", "rejected")
+            span.set_tag("verdict.reason", str(e))
+        else:
+            span.set_exc_info(type(e), e, e.__traceback__)
+        raise
+    else:
+        if verdict:
+            span.set_tag("verdict", "allowed")
+    finally:
+        span.finish()
+
+
+def trace_cache_hit(
+    pipeline_id: str, hook: str, body=None, rejection: Optional[str] = None
+):
+    """
+    Records a `pipelines.<hook>` span, tagged `cache:hit`, for a filter
+    verdict served from the verdict cache instead of running the hook.
+    """
+    if not sampled():
+        return
+
+    span = tracer.trace(f"pipelines.{hook}", resource=pipeline_id)
+    span.set_tag("pipeline.id", pipeline_id)
+    span.set_tag("pipeline.hook", hook)
+    span.set_tag("cache", "hit")
+    length = input_length(body)
+    if length is not None:
+        span.set_metric("input.length", length)
+    if rejection is None:
+        span.set_tag("verdict", "allowed")
+    else:
+        span.set_tag("verdict", "rejected")
+        span.set_tag("verdict.reason", rejection)
+    span.finish()
+
+
+@contextmanager
+def trace_inference(pipeline_id: str, model: str, text: Optional[str] = None):
+    """
+    Wraps a model call inside a pipeline in a `pipelines.inference` span.
+    """
+    if not sampled():
+        yield None
+        return
+
+    with tracer.trace("pipelines.inference", resource=model) as span:
+        span.set_tag("pipeline.id", pipeline_id)
+        span.set_tag("model", model)
+        if text is not None:
+            span.set_metric("input.length", len(text))
+        yield span
+
@@ -0,0 +1,143 @@
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from utils.pipelines.metrics import METRICS
+
+import hashlib
+import json
+import time
+
+
+VERDICT_CACHE_HITS = METRICS.counter(
+    "pipelines_verdict_cache_hits_total",
+    "perform_filters verdicts served from the verdict cache",
+    ("pipeline",),
+)
+VERDICT_CACHE_MISSES = METRICS.counter(
+    "pipelines_verdict_cache_misses_total",
+    "Cacheable perform_filters verdicts that had to be computed",
+    ("pipeline",),
+)
+
+# Valves that route a filter rather than decide its verdicts
+ROUTING_VALVES = ("pipelines", "priority")
+
+
+def last_user_message(body: dict):
+    for message in reversed(body.get("messages") or []):
+        if isinstance(message, dict) and message.get("role") == "user":
+            return message.get("content")
+    return None
+
+
+def pick(values: dict, names) -> dict:
+    if names is None:
+        return values
+    return {name: values.get(name) for name in names}
+
+
+def verdict_key(pipeline_id: str, pipeline, request) -> Optional[tuple]:
+    """
+    Returns the cache key of a filter's verdict on a perform_filters request,
+    or None if the filter does not allow its verdicts to be cached.
+
+    A filter opts in with a `verdict_cache` attribute naming what, besides
+    `body["text"]` and the last user message, its verdicts depend on:
+
+        self.verdict_cache = {"valves": ["threshold"], "config": ["ban_list"]}
+
+    None in place of a list stands for all valves or the whole config.
+
+    Texts are hashed exactly as sent: filters such as regex and ban_list can
+    tell apart inputs that differ only in whitespace or Unicode form.
+    """
+    spec = getattr(pipeline, "verdict_cache", None)
+    if spec is None:
+        return None
+
+    valves = {}
+    if hasattr(pipeline, "valves"):
+        valves = pipeline.valves.model_dump()
+        for name in ROUTING_VALVES:
+            valves.pop(name, None)
+
+    body = request.body
+    material = [
+        pick(valves, spec.get("valves")),
+        pick(request.config, spec.get("config")),
+        "text" in body,
+        body.get("text"),
+        last_user_message(body),
+    ]
+    digest = hashlib.sha256(
+        json.dumps(material, sort_keys=True, default=str).encode()
+    ).hexdigest()
+    return pipeline_id, digest
+
+
+class VerdictCache:
+    """
+    Bounded LRU cache of filter verdicts (None for a pass, or the rejection
+    message) that expire `ttl` seconds after they were computed.
+
+    Entries of a pipeline are dropped when its valves are updated or a
+    reload replaces it. Keys also hash the valves, so verdicts computed
+    under other valves are never served.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: "OrderedDict[tuple, Tuple[float, Optional[str]]]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl > 0
+
+    def get(self, key: tuple) -> Tuple[bool, Optional[str]]:
+        """
+        Returns whether the verdict was cached, and the verdict.
+        """
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self.entries.move_to_end(key)
+            VERDICT_CACHE_HITS.inc((key[0],))
+            return True, entry[1]
+
+        if entry is not None:
+            del self.entries[key]
+        VERDICT_CACHE_MISSES.inc((key[0],))
+        return False, None
+
+    def put(self, key: tuple, message: Optional[str]):
+        self.entries[key] = (time.monotonic() + self.ttl, message)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, pipeline_id: str):
+        for key in [key for key in self.entries if key[0] == pipeline_id]:
+            del self.entries[key]
+
+    def status(self) -> dict:
+        hits = VERDICT_CACHE_HITS.values()
+        misses = VERDICT_CACHE_MISSES.values()
+        sizes = {}
+        for pipeline_id, _ in self.entries:
+            sizes[pipeline_id] = sizes.get(pipeline_id, 0) + 1
+
+        pipelines = {}
+        for labels in set(hits) | set(misses):
+            hit, miss = hits.get(labels, 0), misses.get(labels, 0)
+            pipelines[labels[0]] = {
+                "entries": sizes.get(labels[0], 0),
+                "hits": hit,
+                "misses": miss,
+                "hit_ratio": hit / (hit + miss) if hit + miss else None,
+            }
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "pipelines": pipelines,
+        }